@@ -1,29 +1,36 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import altair as alt
 import uuid
 import os
+from typing import TYPE_CHECKING
+
+# pandas/matplotlib/altair se importan al usarse: importar este módulo es instantáneo
+if TYPE_CHECKING:
+    import pandas as pd
 
-# 📁 Crea carpeta de archivos exportados (si no existe)
 EXPORT_FOLDER = "exported"
-os.makedirs(EXPORT_FOLDER, exist_ok=True)
 
-def save_to_csv(df: pd.DataFrame):
-    """Guarda DataFrame como CSV"""
-    filename = f"{EXPORT_FOLDER}/resultado_{uuid.uuid4().hex[:6]}.csv"
+def _export_folder():
+    # 📁 Crea carpeta de archivos exportados (si no existe) solo cuando se exporta algo
+    os.makedirs(EXPORT_FOLDER, exist_ok=True)
+    return EXPORT_FOLDER
+
+def save_to_csv(df: "pd.DataFrame", name: str = None):
+    """Guarda DataFrame como CSV (con `name` el archivo es estable y se sobrescribe)"""
+    filename = f"{_export_folder()}/{name or 'resultado_' + uuid.uuid4().hex[:6]}.csv"
     df.to_csv(filename, index=False)
     return filename
 
-def save_to_excel(df: pd.DataFrame):
+def save_to_excel(df: "pd.DataFrame"):
     """Guarda DataFrame como Excel"""
-    filename = f"{EXPORT_FOLDER}/resultado_{uuid.uuid4().hex[:6]}.xlsx"
+    filename = f"{_export_folder()}/resultado_{uuid.uuid4().hex[:6]}.xlsx"
     df.to_excel(filename, index=False)
     return filename
 
-def plot_results(df: pd.DataFrame):
+def plot_results(df: "pd.DataFrame"):
     """Crea gráfico con matplotlib (legacy)"""
     if len(df.columns) < 2:
         return None
+
+    import matplotlib.pyplot as plt
         
     x = df.columns[0]
     y = df.columns[1] if len(df.columns) > 1 else df.columns[0]
@@ -37,15 +44,18 @@ def plot_results(df: pd.DataFrame):
     plt.grid(axis='y', alpha=0.3)
     plt.tight_layout()
     
-    filename = f"{EXPORT_FOLDER}/grafico_{uuid.uuid4().hex[:6]}.png"
+    filename = f"{_export_folder()}/grafico_{uuid.uuid4().hex[:6]}.png"
     plt.savefig(filename, dpi=100, bbox_inches='tight')
     plt.close()
     return filename
 
-def plot_with_altair(df: pd.DataFrame, chart_type="bar"):
+def plot_with_altair(df: "pd.DataFrame", chart_type="bar"):
     """Crea gráfico interactivo con Altair"""
     if len(df.columns) < 2:
         return None
+
+    import altair as alt
+    import pandas as pd
     
     x = df.columns[0]
     y = df.columns[1]
@@ -77,7 +87,7 @@ def plot_with_altair(df: pd.DataFrame, chart_type="bar"):
     
     return chart.properties(width=600, height=400).interactive()
 
-def aggregate_data(df: pd.DataFrame, group_by: str, agg_col: str, agg_func: str = "sum"):
+def aggregate_data(df: "pd.DataFrame", group_by: str, agg_col: str, agg_func: str = "sum"):
     """Agrega datos según parámetros"""
     if group_by not in df.columns or agg_col not in df.columns:
         return df
@@ -0,0 +1,225 @@
+import os
+import re
+
+from agent.sql_results import run_sql
+
+# ⚡ Respuestas aproximadas primero (muestra de ventas) mientras corre la SQL exacta
+#   APPROX_ENABLED   -> "0" desactiva la vista previa aproximada
+#   APPROX_MIN_ROWS  -> por debajo de este tamaño de tabla no compensa muestrear
+#   APPROX_PCT       -> porcentaje de muestra (TABLESAMPLE o tabla de muestra)
+#   APPROX_SAMPLE_TABLE -> "1" mantiene ventas_muestra (muestra de Bernoulli por fila) al llegar datos nuevos
+APPROX_ENABLED = os.getenv("APPROX_ENABLED", "1") != "0"
+APPROX_MIN_ROWS = int(os.getenv("APPROX_MIN_ROWS", "1000000"))
+APPROX_PCT = float(os.getenv("APPROX_PCT", "1"))
+APPROX_SAMPLE_TABLE = os.getenv("APPROX_SAMPLE_TABLE", "0") == "1"
+
+SAMPLE_TABLE = "ventas_muestra"
+SAMPLE_INFO_TABLE = "ventas_muestra_info"
+
+Z_95 = 1.96
+
+# Muestra del esquema estrella con las mismas columnas que la vista `ventas`
+STAR_SAMPLE_SOURCE = (
+    "(SELECT h.id, dv.vendedor, ds.sede, dp.producto, h.cantidad, h.precio::numeric AS precio, "
+    "h.fecha, h.monto "
+    "FROM ventas_hechos h TABLESAMPLE SYSTEM ({pct:g}) REPEATABLE (42) "
+    "LEFT JOIN dim_vendedor dv ON dv.vendedor_id = h.vendedor_id "
+    "LEFT JOIN dim_sede ds ON ds.sede_id = h.sede_id "
+    "LEFT JOIN dim_producto dp ON dp.producto_id = h.producto_id)"
+)
+
+_FROM_RE = re.compile(
+    r"\bFROM\s+ventas\b(?:\s+(?:AS\s+)?(?!WHERE\b|GROUP\b|ORDER\b|LIMIT\b|HAVING\b)([A-Za-z_]\w*))?",
+    re.IGNORECASE
+)
+_AGG_RE = re.compile(r"\b(SUM|COUNT)\s*\(", re.IGNORECASE)
+_UNSUPPORTED_RE = re.compile(r"\b(JOIN|UNION|INTERSECT|EXCEPT|WITH|OVER)\b|COUNT\s*\(\s*DISTINCT", re.IGNORECASE)
+_ITEM_RE = re.compile(r"^(SUM|COUNT)\s*\((.*)\)\s+(?:AS\s+)?(\w+|\"[^\"]+\")$", re.IGNORECASE | re.DOTALL)
+
+
+def _split_top_level(s: str, sep: str = ","):
+    """Divide por `sep` ignorando lo que está entre paréntesis o comillas."""
+    parts, depth, quote, start = [], 0, None, 0
+    for i, ch in enumerate(s):
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in ("'", '"'):
+            quote = ch
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == sep and depth == 0:
+            parts.append(s[start:i])
+            start = i + 1
+    parts.append(s[start:])
+    return parts
+
+
+def _select_list_bounds(sql: str):
+    """(inicio, fin) de la lista del SELECT principal, o None si no se reconoce."""
+    m = re.match(r"\s*SELECT\s+", sql, re.IGNORECASE)
+    if not m:
+        return None
+    depth = 0
+    for i in range(m.end(), len(sql)):
+        ch = sql[i]
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif depth == 0 and re.match(r"\bFROM\b", sql[i:i + 5], re.IGNORECASE) and not sql[i - 1].isalnum():
+            return m.end(), i
+    return None
+
+
+def _scale_aggregates(fragment: str, scale: str) -> str:
+    return _AGG_RE.sub(lambda m: f"{scale} * {m.group(1).upper()}(", fragment)
+
+
+def rewrite_for_sample(sql: str, fraction: float, source: str, tablesample: str = ""):
+    """
+    Reescribe la SQL para leer de una muestra (tabla `source`, opcionalmente con la
+    cláusula `tablesample`) con fracción `fraction`:
+      - SUM/COUNT se escalan por 1/fraction (estimador de Horvitz-Thompson)
+      - por cada `SUM(expr) AS alias` / `COUNT(...) AS alias` se añade `alias_ic95`
+        (semiancho del intervalo del 95%, asumiendo muestreo por filas)
+    Devuelve None si la SQL no es una agregación simple sobre `ventas`.
+    """
+    if not sql or not (0 < fraction < 1):
+        return None
+    stmt = sql.strip().rstrip(";")
+    if _UNSUPPORTED_RE.search(stmt) or len(_FROM_RE.findall(stmt)) != 1:
+        return None
+    if stmt.upper().count("SELECT") != 1 or not _AGG_RE.search(stmt):
+        return None
+    bounds = _select_list_bounds(stmt)
+    if bounds is None:
+        return None
+
+    scale = f"{1.0 / fraction:.10g}"
+    start, end = bounds
+    items = _split_top_level(stmt[start:end])
+
+    new_items, ci_items = [], []
+    for item in items:
+        raw = item.strip()
+        m = _ITEM_RE.match(raw)
+        if m:
+            func, expr, alias = m.group(1).upper(), m.group(2), m.group(3)
+            ci_alias = f'"{alias.strip(chr(34))}_ic95"'
+            if func == "SUM":
+                var = f"SUM(({expr}) * ({expr}))"
+            else:
+                var = f"COUNT({expr})"
+            ci_items.append(f"{Z_95} * SQRT({1 - fraction:.10g} * {var}) * {scale} AS {ci_alias}")
+        new_items.append(_scale_aggregates(raw, scale))
+
+    head = stmt[:start]
+    tail = _scale_aggregates(stmt[end:], scale)
+    # El alias va antes de TABLESAMPLE: FROM ventas v TABLESAMPLE SYSTEM (1).
+    # Una subconsulta como `source` necesita alias: se llama `ventas` si la SQL no lo tenía
+    def _from(m):
+        alias = m.group(1) or ("ventas" if source.startswith("(") else None)
+        return " ".join(p for p in ("FROM", source, alias, tablesample) if p)
+
+    tail = _FROM_RE.sub(_from, tail, count=1)
+    return head + ", ".join(new_items + ci_items) + " " + tail
+
+
+# ============= MUESTRA =============
+def table_size_estimate(db) -> int:
+    """Filas estimadas de ventas (pg_class.reltuples: no escanea la tabla)."""
+    from sqlalchemy import text
+
+    # Con el esquema estrella `ventas` es una vista: las filas están en ventas_hechos
+    with db._engine.connect() as conn:
+        n = conn.execute(text(
+            "SELECT reltuples::bigint FROM pg_class "
+            "WHERE oid = COALESCE(to_regclass('ventas_hechos'), 'ventas'::regclass)"
+        )).scalar()
+    return int(n or 0)
+
+
+def sample_fraction(db):
+    """Fracción de la tabla de muestra estratificada si existe, o None."""
+    from sqlalchemy import text
+
+    with db._engine.connect() as conn:
+        exists = conn.execute(text("SELECT to_regclass(:t)"), {"t": SAMPLE_INFO_TABLE}).scalar()
+        if not exists:
+            return None
+        return conn.execute(text(
+            f"SELECT fraccion FROM {SAMPLE_INFO_TABLE} ORDER BY creada DESC LIMIT 1"
+        )).scalar()
+
+
+def refresh_sample_table(db, pct: float = APPROX_PCT):
+    """
+    (Re)construye ventas_muestra: cada fila entra con probabilidad `fracción`, así que la
+    probabilidad de inclusión es la misma para todas y el escalado por 1/fracción es insesgado.
+    """
+    from sqlalchemy import text
+
+    fraction = pct / 100.0
+    with db._engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {SAMPLE_TABLE}"))
+        conn.execute(text(
+            f"CREATE TABLE {SAMPLE_TABLE} AS "
+            "SELECT id, vendedor, sede, producto, cantidad, precio, fecha FROM ventas "
+            "WHERE random() < :f"
+        ), {"f": fraction})
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {SAMPLE_INFO_TABLE} (fraccion NUMERIC, creada TIMESTAMPTZ DEFAULT now())"
+        ))
+        conn.execute(text(f"DELETE FROM {SAMPLE_INFO_TABLE}"))
+        conn.execute(text(f"INSERT INTO {SAMPLE_INFO_TABLE}(fraccion) VALUES (:f)"), {"f": fraction})
+        conn.execute(text(f"ANALYZE {SAMPLE_TABLE}"))
+    return fraction
+
+
+def _star_schema(db) -> bool:
+    """True si `ventas` es la vista del esquema estrella (db/init.sql)."""
+    from sqlalchemy import text
+
+    with db._engine.connect() as conn:
+        return conn.execute(text("SELECT to_regclass('ventas_hechos') IS NOT NULL")).scalar()
+
+
+def approximate_sql(db, sql: str, pct: float = APPROX_PCT):
+    """(sql_aproximada, fracción) usando la tabla de muestra o TABLESAMPLE SYSTEM; None si no aplica."""
+    fraction = sample_fraction(db)
+    if fraction:
+        source, tablesample = SAMPLE_TABLE, ""
+        fraction = float(fraction)
+    elif _star_schema(db):
+        # TABLESAMPLE no se puede aplicar a una vista: se muestrea la tabla de hechos y se
+        # reconstruyen las columnas de `ventas` con las dimensiones
+        fraction = pct / 100.0
+        source, tablesample = STAR_SAMPLE_SOURCE.format(pct=pct), ""
+    else:
+        fraction = pct / 100.0
+        # SYSTEM muestrea por bloques: rápido, pero el IC es optimista si los datos están agrupados
+        source, tablesample = "ventas", f"TABLESAMPLE SYSTEM ({pct:g}) REPEATABLE (42)"
+    approx = rewrite_for_sample(sql, fraction, source, tablesample)
+    return (approx, fraction) if approx else None
+
+
+def run_progressive(db, sql: str, on_preview=None, exact: bool = False, execute=None):
+    """
+    Ejecuta primero la versión aproximada (si aplica) y llama a on_preview(df, fracción);
+    después ejecuta y devuelve la SQL exacta. Con exact=True (exportaciones) no hay vista previa.
+    execute() sustituye a run_sql(db, sql) para la exacta (p.ej. la sentencia preparada de una plantilla).
+    """
+    if on_preview is not None and APPROX_ENABLED and not exact:
+        try:
+            if table_size_estimate(db) >= APPROX_MIN_ROWS:
+                plan = approximate_sql(db, sql)
+                if plan is not None:
+                    approx_sql, fraction = plan
+                    on_preview(run_sql(db, approx_sql), fraction)
+        except Exception:
+            # la vista previa es opcional: si falla seguimos con la exacta
+            pass
+    return execute() if execute is not None else run_sql(db, sql)
@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+
+# 🗃️ Cachés compartidas por proceso (todas las sesiones de Streamlit las ven)
+#   - SQL:       pregunta normalizada -> SQL final
+#   - Resultado: SQL -> (DataFrame, timestamp de cálculo)
+_lock = threading.Lock()
+_sql_cache = {}
+_result_cache = OrderedDict()
+CACHE_MAX_RESULTS = int(os.getenv("CACHE_MAX_RESULTS", "200"))
+
+# 📜 Log de preguntas para sacar el top-N
+HISTORY_LOG = os.getenv("HISTORY_LOG", "logs/historial.jsonl")
+
+
+def normalize_question(question: str) -> str:
+    """Clave de caché: minúsculas y espacios colapsados."""
+    return " ".join((question or "").lower().split())
+
+
+def get_cached_sql(question: str):
+    with _lock:
+        return _sql_cache.get(normalize_question(question))
+
+
+def get_cached_result(sql_stmt: str):
+    """Devuelve (df, computed_at) o None."""
+    with _lock:
+        return _result_cache.get(sql_stmt)
+
+
+def get_cached_answer(question: str):
+    """Devuelve (sql, df, computed_at) si la pregunta tiene SQL y resultado en caché."""
+    with _lock:
+        sql_stmt = _sql_cache.get(normalize_question(question))
+        if sql_stmt is None or sql_stmt not in _result_cache:
+            return None
+        df, computed_at = _result_cache[sql_stmt]
+        return sql_stmt, df, computed_at
+
+
+def put_cached(question: str, sql_stmt: str, df=None):
+    """Guarda la SQL de la pregunta y, si se da, su resultado con la hora actual."""
+    with _lock:
+        _sql_cache[normalize_question(question)] = sql_stmt
+        if df is not None:
+            _result_cache[sql_stmt] = (df, time.time())
+            _result_cache.move_to_end(sql_stmt)
+            while len(_result_cache) > CACHE_MAX_RESULTS:
+                _result_cache.popitem(last=False)
+
+
+def cached_sqls():
+    """Lista de SQL distintas presentes en la caché de preguntas."""
+    with _lock:
+        return list(set(_sql_cache.values()))
+
+
+def answer_age(question: str):
+    """Segundos desde que se calculó la respuesta de la pregunta (None si no está)."""
+    hit = get_cached_answer(question)
+    if hit is None:
+        return None
+    return time.time() - hit[2]
+
+
+def format_age(seconds) -> str:
+    if seconds is None:
+        return "sin precalcular"
+    if seconds < 60:
+        return f"hace {int(seconds)} s"
+    if seconds < 3600:
+        return f"hace {int(seconds // 60)} min"
+    return f"hace {seconds / 3600:.1f} h"
+
+
+def clear_cache():
+    with _lock:
+        _sql_cache.clear()
+        _result_cache.clear()
+
+
+# ============= HISTORIAL EN DISCO =============
+def log_question(question: str, sql_stmt=None, rows=None, elapsed=None, **extra):
+    """Añade una línea JSON al log de historial (best effort)."""
+    try:
+        folder = os.path.dirname(HISTORY_LOG)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        entry = {
+            "ts": time.time(),
+            "query": question,
+            "sql": sql_stmt,
+            "rows": rows,
+            "time": elapsed,
+        }
+        entry.update(extra)
+        with open(HISTORY_LOG, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    except OSError:
+        pass
+
+
+def read_history(path=None):
+    """Lee el log de historial; ignora líneas corruptas."""
+    path = path or HISTORY_LOG
+    if not os.path.exists(path):
+        return []
+    entries = []
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    return entries
+
+
+def top_questions(n: int, path=None):
+    """Las N preguntas más frecuentes del historial (con su texto original más reciente)."""
+    counts = Counter()
+    original = {}
+    for entry in read_history(path):
+        q = entry.get("query")
+        if not q:
+            continue
+        key = normalize_question(q)
+        counts[key] += 1
+        original[key] = q
+    return [original[key] for key, _ in counts.most_common(n)]
@@ -0,0 +1,91 @@
+import os
+import re
+import threading
+import time
+
+from agent.query_parser import extract_intent
+
+# ============= UTILIDADES FECHAS (REGLA DURA + FALLBACK) =============
+# Los límites de fechas cambian poco: se cachean unos segundos para no ir a la BD en cada pregunta
+DATE_BOUNDS_TTL = float(os.getenv("DATE_BOUNDS_TTL", "300"))
+_bounds_lock = threading.Lock()
+_bounds_cache = {}
+
+# Detecta BETWEEN 'YYYY-MM-DD' AND 'YYYY-MM-DD'
+BETWEEN_RE = re.compile(
+    r"fecha\s+BETWEEN\s+'(\d{4})-(\d{2})-(\d{2})'\s+AND\s+'(\d{4})-(\d{2})-(\d{2})'",
+    re.IGNORECASE
+)
+
+
+def get_date_bounds_and_years(db):
+    """Devuelve (min_fecha, max_fecha, [years disponibles])."""
+    from sqlalchemy import text
+
+    key = id(db)
+    with _bounds_lock:
+        hit = _bounds_cache.get(key)
+        if hit is not None and time.time() - hit[0] < DATE_BOUNDS_TTL:
+            return hit[1]
+
+    with db._engine.connect() as conn:
+        bounds = conn.execute(text(
+            "SELECT MIN(fecha) AS minf, MAX(fecha) AS maxf FROM ventas"
+        )).mappings().first()
+        years = conn.execute(text(
+            "SELECT DISTINCT EXTRACT(YEAR FROM fecha)::int AS y "
+            "FROM ventas ORDER BY y"
+        )).fetchall()
+    minf, maxf = bounds["minf"], bounds["maxf"]
+    year_list = [r[0] for r in years]
+    value = (minf, maxf, year_list)
+
+    with _bounds_lock:
+        _bounds_cache[key] = (time.time(), value)
+    return value
+
+
+def infer_missing_year_from_query(nl_query: str, db, intent=None):
+    """
+    Si el usuario menciona un mes en español y NO menciona año (20xx),
+    añadimos por defecto el año MÁS RECIENTE con datos en la BD.
+    """
+    intent = intent or extract_intent(nl_query)
+    if intent["years"] or not intent["months"]:
+        return nl_query  # no tocamos (y no vamos a la BD)
+
+    _, _, years = get_date_bounds_and_years(db)
+    if not years:
+        return nl_query
+    last_year = years[-1]
+    return f"{nl_query.strip()} de {last_year}"
+
+
+def patch_sql_to_latest_year_if_out_of_range(sql_stmt: str, db):
+    """
+    Si el agente generó un BETWEEN fuera del rango de la BD (p.ej. 2023),
+    sustituimos el año por el último año disponible, manteniendo mes/día.
+    """
+    if not sql_stmt:
+        return sql_stmt
+    m = BETWEEN_RE.search(sql_stmt)
+    if not m:
+        return sql_stmt
+
+    y1, m1, d1, y2, m2, d2 = map(int, m.groups())
+    minf, maxf, years = get_date_bounds_and_years(db)
+    if not years:
+        return sql_stmt
+
+    # Si cualquiera de los años está antes del mínimo, subimos al último año con datos
+    if y1 < minf.year or y2 < minf.year:
+        target_year = years[-1]
+        new1 = f"{target_year}-{m1:02d}-{d1:02d}"
+        new2 = f"{target_year}-{m2:02d}-{d2:02d}"
+        return BETWEEN_RE.sub(
+            f"fecha BETWEEN '{new1}' AND '{new2}'",
+            sql_stmt
+        )
+
+    # También podríamos recortar si excede el máximo, pero no es necesario ahora.
+    return sql_stmt
@@ -0,0 +1,145 @@
+import math
+import os
+import threading
+from collections import Counter, defaultdict
+
+from agent.cache import normalize_question, read_history
+from agent.query_parser import fold
+
+# 📚 Ejemplos verificados pregunta -> SQL (de ejecuciones con filas) para few-shot
+#   FEWSHOT_ENABLED   -> "0" desactiva la inyección de ejemplos
+#   FEWSHOT_K         -> cuántos ejemplos similares se inyectan
+#   FEWSHOT_MIN_SCORE -> similitud coseno mínima para considerar un ejemplo
+FEWSHOT_ENABLED = os.getenv("FEWSHOT_ENABLED", "1") != "0"
+FEWSHOT_K = int(os.getenv("FEWSHOT_K", "3"))
+FEWSHOT_MIN_SCORE = float(os.getenv("FEWSHOT_MIN_SCORE", "0.2"))
+
+NGRAM_SIZES = (3, 4, 5)
+
+
+def char_ngrams(text: str):
+    """n-gramas de caracteres por palabra (con bordes), sobre texto sin tildes."""
+    grams = Counter()
+    for word in fold(text).split():
+        padded = f" {word} "
+        for n in NGRAM_SIZES:
+            for i in range(len(padded) - n + 1):
+                grams[padded[i:i + n]] += 1
+    return grams
+
+
+class ExampleStore:
+    """
+    Índice TF-IDF de n-gramas de caracteres (local, sin servicios externos)
+    sobre pares verificados pregunta -> SQL.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._examples = {}   # pregunta normalizada -> {"question", "sql", "rows"}
+        self._dirty = True
+        self._vectors = {}
+        self._postings = {}
+        self._idf = {}
+
+    def __len__(self):
+        return len(self._examples)
+
+    def add(self, question: str, sql_stmt: str, rows: int):
+        """Solo se guardan ejecuciones con SQL y al menos una fila."""
+        if not question or not sql_stmt or not rows:
+            return
+        with self._lock:
+            self._examples[normalize_question(question)] = {
+                "question": question.strip(), "sql": sql_stmt.strip(), "rows": int(rows)
+            }
+            self._dirty = True
+
+    def _rebuild(self):
+        grams = {key: char_ngrams(ex["question"]) for key, ex in self._examples.items()}
+        df = Counter()
+        for g in grams.values():
+            df.update(g.keys())
+        n_docs = len(grams)
+        self._idf = {t: math.log((1 + n_docs) / (1 + c)) + 1 for t, c in df.items()}
+
+        self._vectors, self._postings = {}, defaultdict(list)
+        for key, g in grams.items():
+            vec = self._weigh(g)
+            self._vectors[key] = vec
+            for term, w in vec.items():
+                self._postings[term].append((key, w))
+        self._dirty = False
+
+    def _weigh(self, grams):
+        vec = {t: (1 + math.log(c)) * self._idf[t] for t, c in grams.items() if t in self._idf}
+        norm = math.sqrt(sum(w * w for w in vec.values())) or 1.0
+        return {t: w / norm for t, w in vec.items()}
+
+    def search(self, question: str, k: int = FEWSHOT_K, min_score: float = FEWSHOT_MIN_SCORE,
+               exclude_same: bool = False):
+        """Top-k ejemplos más parecidos: lista de (similitud, ejemplo)."""
+        with self._lock:
+            if self._dirty:
+                self._rebuild()
+            if not self._vectors:
+                return []
+            query = self._weigh(char_ngrams(question))
+            scores = defaultdict(float)
+            for term, qw in query.items():
+                for key, w in self._postings.get(term, ()):
+                    scores[key] += qw * w
+            skip = normalize_question(question) if exclude_same else None
+            ranked = sorted(
+                ((s, key) for key, s in scores.items() if s >= min_score and key != skip),
+                reverse=True
+            )[:k]
+            return [(s, dict(self._examples[key])) for s, key in ranked]
+
+
+def load_from_history(store: ExampleStore, path=None):
+    """Carga en el índice las ejecuciones verificadas del historial (UI, API y run_examples.py)."""
+    for entry in read_history(path):
+        store.add(entry.get("query"), entry.get("sql"), entry.get("rows") or 0)
+    return store
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_example_store() -> ExampleStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = load_from_history(ExampleStore())
+    return _store
+
+
+def build_fewshot_input(question: str, examples) -> str:
+    """Antepone los ejemplos verificados a la pregunta que recibe el agente."""
+    if not examples:
+        return question
+    lines = [
+        "Ejemplos verificados de preguntas similares y la SQL correcta sobre la tabla ventas "
+        "(úsalos como guía de nombres de columnas, sedes y formatos de fecha):",
+        "",
+    ]
+    for _, ex in examples:
+        lines.append(f"Pregunta: {ex['question']}")
+        lines.append(f"SQL: {ex['sql']}")
+        lines.append("")
+    lines.append(f"Pregunta a responder: {question}")
+    return "\n".join(lines)
+
+
+def llm_calls_report(path=None):
+    """Promedio de llamadas al LLM por pregunta, con y sin ejemplos few-shot (según el historial)."""
+    groups = defaultdict(list)
+    for entry in read_history(path):
+        # Solo ejecuciones del agente: las respuestas de caché o plantilla (None, o 0 en
+        # historiales antiguos) no pasan por el LLM y sesgarían el grupo "sin ejemplos"
+        if not entry.get("llm_calls") or entry.get("template"):
+            continue
+        groups["con ejemplos" if entry.get("fewshot") else "sin ejemplos"].append(entry["llm_calls"])
+    return {name: (len(v), sum(v) / len(v)) for name, v in groups.items() if v}
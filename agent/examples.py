@@ -0,0 +1,23 @@
+# Preguntas de ejemplo compartidas por la UI, run_examples.py y el precalentamiento de caché
+EXAMPLES = [
+    # Ventas por sede (monto)
+    "Total de ventas (cantidad*precio) por sede en 2025 — todas las sedes, sin límite, ordenar de mayor a menor.",
+    # Top N productos en una ciudad y año
+    "Top 5 productos más vendidos en Medellín en 2025 — sumar cantidad, ordenar de mayor a menor.",
+    # Producto más vendido en un mes/año concreto
+    "Producto más vendido en Bogotá en septiembre de 2024 — sumar cantidad, devolver solo 1 fila (el máximo).",
+    # Ventas por mes (monto) de un año
+    "Ventas totales por mes en 2024 — sumar cantidad*precio por mes, todas las filas (sin límite), ordenar por mes ascendente.",
+    # Ventas por producto en una ciudad
+    "Total de ventas (cantidad*precio) por producto en Cali durante 2025 — sin límite, ordenar de mayor a menor.",
+    # Sede ganadora (1 fila)
+    "Sede con mayores ventas en 2025 — sumar cantidad*precio y devolver solo la sede ganadora (1 fila).",
+    # Top productos a nivel nacional
+    "Top 10 productos con mayor cantidad vendida en todo 2025 (todas las sedes) — sumar cantidad, ordenar de mayor a menor.",
+    # Ventas diarias en un rango concreto
+    "Ventas totales por día en Bogotá entre 2025-11-01 y 2025-11-30 — sumar cantidad*precio, sin límite, ordenar por fecha ascendente.",
+    # Ranking de vendedores por monto
+    "Top 5 vendedores por ventas totales (cantidad*precio) en 2025 — ordenar de mayor a menor.",
+    # Conteo de registros por sede (útil para debug)
+    "Número de registros por sede en 2025 — sin límite, ordenar alfabéticamente por sede.",
+]
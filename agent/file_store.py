@@ -0,0 +1,65 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo se serializan los hilos del proceso
+    fcntl = None
+
+# 🗂️ Archivos JSON compartidos entre procesos (la UI y la API montan el mismo logs/):
+#   cada escritura relee el archivo bajo un lock, aplica el cambio y lo reemplaza de forma
+#   atómica, así ningún proceso pisa lo que escribió el otro. Los lectores comparan el
+#   mtime para saber si tienen que recargar.
+_thread_lock = threading.Lock()
+
+
+@contextmanager
+def file_lock(path: str):
+    """Lock exclusivo (entre hilos y procesos) sobre `path` + ".lock"."""
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with _thread_lock:
+        with open(path + ".lock", "a") as fh:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def file_mtime(path: str):
+    """mtime del archivo (None si no existe)."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def read_json(path: str, default):
+    """Contenido del archivo, o `default` si no existe o está corrupto."""
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return default
+
+
+def update_json(path: str, default, update):
+    """
+    Relee el archivo bajo el lock, escribe update(datos) y devuelve lo escrito.
+    La escritura va a un temporal y se renombra: un lector nunca ve el archivo a medias.
+    """
+    with file_lock(path):
+        data = update(read_json(path, default))
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(data, fh, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
+    return data
@@ -1,31 +1,123 @@
-from langchain.agents import create_sql_agent
-from langchain.agents.agent_toolkits import SQLDatabaseToolkit
-from langchain.sql_database import SQLDatabase
-from langchain_community.chat_models import BedrockChat
-import boto3
 import os
+import threading
+import time
+from functools import partial
+
+from agent.model_cascade import ModelCascade, cascade_model_ids, validate_answer
+
+# langchain/boto3/sqlalchemy se importan dentro de get_agent_and_db: importar este
+# módulo no cuesta nada y el coste se paga en el primer uso (o en el hilo de arranque).
+
+# ⏱️ Tiempos de inicialización (segundos) de la última construcción del agente
+INIT_TIMINGS = {}
+
+# 🚦 Estado del agente compartido: "idle" | "running" | "ready" | "error" y la última excepción
+# (de la construcción o, ya listo, de on_ready)
+INIT_STATE = {"status": "idle", "error": None}
+
+_shared = None
+_shared_lock = threading.Lock()
+_on_ready = None
+_init_thread = None
+_init_lock = threading.Lock()
+
 
 def get_agent_and_db():
+    t0 = time.perf_counter()
+    from langchain.agents import create_sql_agent
+    from langchain.agents.agent_toolkits import SQLDatabaseToolkit
+    from langchain.sql_database import SQLDatabase
+    from langchain_community.chat_models import BedrockChat
+    import boto3
+    INIT_TIMINGS["imports"] = time.perf_counter() - t0
+
     bedrock_runtime = boto3.client("bedrock-runtime", region_name=os.getenv("AWS_DEFAULT_REGION", "us-east-1"))
-    model_id = os.getenv("BEDROCK_MODEL_ID", "anthropic.claude-3-sonnet-20240229-v1:0")
+    # 🪜 Con BEDROCK_MODEL_IDS se monta una cascada (del modelo más rápido al más capaz)
+    model_ids = cascade_model_ids(os.getenv("BEDROCK_MODEL_ID", "anthropic.claude-3-sonnet-20240229-v1:0"))
     db_uri = os.getenv("DB_URI", "postgresql://user:password@db:5432/postgres")
+    # Solo se refleja el esquema de las tablas que el agente necesita
+    include_tables = [t.strip() for t in os.getenv("DB_INCLUDE_TABLES", "ventas").split(",") if t.strip()]
 
-    
-    llm = BedrockChat(
-        client=bedrock_runtime,
-        model_id=model_id,
-        model_kwargs={"temperature": 0}
-    )
+    t0 = time.perf_counter()
+    llms = [
+        (model_id, BedrockChat(
+            client=bedrock_runtime,
+            model_id=model_id,
+            model_kwargs={"temperature": 0}
+        ))
+        for model_id in model_ids
+    ]
+    INIT_TIMINGS["llm"] = time.perf_counter() - t0
 
-    db = SQLDatabase.from_uri(db_uri)
-    toolkit = SQLDatabaseToolkit(db=db, llm=llm)
-    
-    agent_executor = create_sql_agent(
-        llm=llm,
-        toolkit=toolkit,
-        verbose=True,
-        handle_parsing_errors=True,
-        agent_executor_kwargs = {"return_intermediate_steps": True})
+    t0 = time.perf_counter()
+    # view_support: con el esquema estrella (db/init.sql) `ventas` es una vista
+    db = SQLDatabase.from_uri(db_uri, include_tables=include_tables or None, view_support=True)
+    INIT_TIMINGS["schema"] = time.perf_counter() - t0
 
+    t0 = time.perf_counter()
+    stages = []
+    for model_id, llm in llms:
+        toolkit = SQLDatabaseToolkit(db=db, llm=llm)
 
+        stages.append((model_id, create_sql_agent(
+            llm=llm,
+            toolkit=toolkit,
+            verbose=True,
+            handle_parsing_errors=True,
+            agent_executor_kwargs = {"return_intermediate_steps": True})))
+    INIT_TIMINGS["agent"] = time.perf_counter() - t0
+
+    # Con un solo modelo la cascada no escala ni valida con EXPLAIN, pero registra éxito y latencia
+    agent_executor = ModelCascade(stages, validate=partial(validate_answer, db))
     return agent_executor, db
+
+
+def get_shared_agent_and_db():
+    """
+    Agente y BD compartidos por el proceso: se construyen en el primer uso. Si falla, la
+    excepción queda en INIT_STATE y la siguiente llamada lo vuelve a intentar. La primera
+    construcción correcta (en el hilo de arranque o en una petición) llama a on_ready.
+    """
+    global _shared
+    built = False
+    with _shared_lock:
+        if _shared is None:
+            try:
+                _shared = get_agent_and_db()
+            except Exception as e:
+                INIT_STATE.update(status="error", error=e)
+                raise
+            INIT_STATE.update(status="ready", error=None)
+            built = True
+    if built and _on_ready is not None:
+        try:
+            _on_ready(*_shared)
+        except Exception as e:
+            # el agente sirve igual; los trabajos en segundo plano no arrancaron
+            INIT_STATE["error"] = e
+    return _shared
+
+
+def init_in_background(on_ready=None):
+    """
+    Construye el agente compartido en un hilo (para no bloquear el arranque).
+    on_ready(agent, db) se llama cuando el agente queda construido, p.ej. para lanzar el
+    warm-up de caché. El resultado queda en INIT_STATE; tras un error, volver a llamarla reintenta.
+    """
+    global _on_ready, _init_thread
+    with _init_lock:
+        if on_ready is not None:
+            _on_ready = on_ready
+        if _shared is not None or (_init_thread is not None and _init_thread.is_alive()):
+            return _init_thread
+        INIT_STATE.update(status="running", error=None)
+
+        def _run():
+            try:
+                get_shared_agent_and_db()
+            except Exception:
+                pass  # queda en INIT_STATE
+
+        _init_thread = threading.Thread(target=_run, name="agent-init", daemon=True)
+        _init_thread.start()
+        return _init_thread
@@ -0,0 +1,124 @@
+import json
+import os
+import threading
+import time
+
+from agent.sql_results import extract_sql_and_results
+
+# 🪜 Cascada de modelos: un modelo pequeño y rápido intenta primero; si su respuesta no
+# pasa la validación (SQL que planifica, dentro del límite de coste y con filas) se
+# escala al siguiente. Se expone con la misma interfaz que el AgentExecutor (.invoke).
+#   BEDROCK_MODEL_IDS -> modelos en orden, separados por coma (vacío = solo BEDROCK_MODEL_ID)
+#   CASCADE_MAX_COST  -> coste máximo estimado por EXPLAIN para aceptar la SQL (0 = sin límite)
+CASCADE_MAX_COST = float(os.getenv("CASCADE_MAX_COST", "1e7"))
+
+# model_id -> {"attempts", "accepted", "seconds", "llm_calls"}
+MODEL_STATS = {}
+_stats_lock = threading.Lock()
+
+
+def cascade_model_ids(default: str):
+    """Modelos de la cascada en orden; con BEDROCK_MODEL_IDS vacío, solo el modelo por defecto."""
+    ids = [m.strip() for m in os.getenv("BEDROCK_MODEL_IDS", "").split(",") if m.strip()]
+    return ids or [default]
+
+
+def record_attempt(model_id: str, accepted: bool, seconds: float, llm_calls: int = 0):
+    with _stats_lock:
+        stats = MODEL_STATS.setdefault(model_id, {"attempts": 0, "accepted": 0, "seconds": 0.0, "llm_calls": 0})
+        stats["attempts"] += 1
+        stats["accepted"] += int(accepted)
+        stats["seconds"] += seconds
+        stats["llm_calls"] += llm_calls
+
+
+def model_stats_report():
+    """{model_id: (intentos, tasa de éxito, latencia media en s)} en el orden de uso."""
+    with _stats_lock:
+        return {
+            model_id: (s["attempts"], s["accepted"] / s["attempts"], s["seconds"] / s["attempts"])
+            for model_id, s in MODEL_STATS.items() if s["attempts"]
+        }
+
+
+def explain_cost(db, sql_stmt: str) -> float:
+    """Coste total estimado por el planner (falla si la SQL no parsea o no planifica)."""
+    with db._engine.connect() as conn:
+        # Sin parámetros: psycopg2 no interpreta los '%' de la SQL (ILIKE '%cali%', módulo)
+        plan = conn.exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON) {sql_stmt.strip().rstrip(';')}",
+            execution_options={"no_parameters": True},
+        ).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return float(plan[0]["Plan"]["Total Cost"])
+
+
+def validate_answer(db, sql_stmt, raw_results, max_cost: float = CASCADE_MAX_COST):
+    """(aceptada, motivo) para la SQL y las filas que devolvió un modelo."""
+    if sql_stmt is None:
+        return False, "sin SQL"
+    try:
+        cost = explain_cost(db, sql_stmt)
+    except Exception as e:
+        return False, f"SQL inválida: {str(e).splitlines()[0]}"
+    if max_cost and cost > max_cost:
+        return False, f"coste {cost:,.0f} > {max_cost:,.0f}"
+    if not raw_results:
+        return False, "sin filas"
+    return True, "ok"
+
+
+class ModelCascade:
+    """
+    Lista ordenada de (model_id, agente). invoke() devuelve la salida del primer agente cuya
+    respuesta valida, o la del último si ninguno lo hace, con "model_id", "llm_calls" y
+    "cascade" (un registro por intento) añadidos. Los errores de un modelo intermedio hacen
+    escalar; los del último se propagan.
+    """
+
+    def __init__(self, stages, validate):
+        # validate(sql, filas) -> (aceptada, motivo)
+        self.stages = list(stages)
+        self.validate = validate
+
+    @property
+    def model_ids(self):
+        return [model_id for model_id, _ in self.stages]
+
+    def invoke(self, inputs, **kwargs):
+        attempts, total_calls, result = [], 0, {}
+        for i, (model_id, agent) in enumerate(self.stages):
+            last = i == len(self.stages) - 1
+            t0 = time.perf_counter()
+            try:
+                result = agent.invoke(inputs, **kwargs)
+            except Exception as e:
+                record_attempt(model_id, False, time.perf_counter() - t0, 1)
+                if last:
+                    raise  # sin modelo al que escalar: el error (Bedrock, credenciales...) se propaga
+                # p.ej. throttling del modelo pequeño: se prueba el siguiente
+                total_calls += 1
+                attempts.append({"model_id": model_id, "accepted": False, "reason": f"error: {e}",
+                                 "seconds": time.perf_counter() - t0, "llm_calls": 1})
+                continue
+
+            steps = result.get("intermediate_steps", [])
+            calls = len(steps) + 1
+            total_calls += calls
+            if last:
+                # El último modelo no se valida: no hay a quién escalar (y se ahorra el EXPLAIN)
+                sql_stmt, raw_results = extract_sql_and_results(steps)
+                accepted = sql_stmt is not None and bool(raw_results)
+                reason = "ok (sin EXPLAIN)" if accepted else ("sin filas" if sql_stmt else "sin SQL")
+            else:
+                accepted, reason = self.validate(*extract_sql_and_results(steps))
+            secs = time.perf_counter() - t0
+
+            record_attempt(model_id, accepted, secs, calls)
+            attempts.append({"model_id": model_id, "accepted": accepted, "reason": reason,
+                             "seconds": secs, "llm_calls": calls})
+            if accepted:
+                break
+
+        return {**result, "model_id": attempts[-1]["model_id"], "llm_calls": total_calls, "cascade": attempts}
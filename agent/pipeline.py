@@ -0,0 +1,143 @@
+import time
+
+from agent.approx import run_progressive
+from agent.cache import get_cached_answer, get_cached_sql, put_cached
+from agent.date_rules import infer_missing_year_from_query, patch_sql_to_latest_year_if_out_of_range
+from agent.example_store import FEWSHOT_ENABLED, build_fewshot_input, get_example_store
+from agent.query_parser import extract_intent
+from agent.sql_results import extract_sql_and_results, normalize_cell, results_to_dataframe, run_sql
+from agent.sql_templates import learn_template, match_template
+
+
+def answer_question(agent, db, question: str, use_cache: bool = True,
+                    on_preview=None, exact: bool = False) -> dict:
+    """
+    Pipeline completo NL -> SQL -> DataFrame, compartido por la UI y la API.
+    Devuelve un dict con la pregunta efectiva, la SQL elegida, el DataFrame y tiempos por etapa.
+    Si la SQL ya se conoce (caché o plantilla) y hay que ejecutarla, on_preview(df, fracción)
+    recibe antes una versión aproximada sobre una muestra; exact=True (exportaciones) la desactiva.
+    """
+    import pandas as pd
+
+    timings = {}
+    t_start = time.perf_counter()
+
+    # 🧭 Intención (tipo de salida, meses, años...) en una sola pasada
+    intent = extract_intent(question)
+    timings["intent"] = time.perf_counter() - t_start
+
+    answer = {
+        "question": question,
+        "query": question,
+        "intent": intent,
+        "sql": None,
+        "df": pd.DataFrame(),
+        "cached": False,
+        "computed_at": None,
+        "patched": False,
+        "llm_calls": None,  # solo las respuestas del agente llaman al LLM (caché/plantilla: None)
+        "fewshot": 0,
+        "template": False,
+        "model": None,
+        "cascade": [],
+        "timings": timings,
+    }
+
+    # ⚡ Respuesta precalculada (warm-up o consulta previa de cualquier sesión)
+    if use_cache:
+        cached = get_cached_answer(question)
+        if cached is not None:
+            answer["sql"], answer["df"], answer["computed_at"] = cached
+            answer["cached"] = True
+            timings["total"] = time.perf_counter() - t_start
+            return answer
+
+        # SQL conocida pero sin resultado en caché: no hace falta el LLM
+        sql_stmt = get_cached_sql(question)
+        if sql_stmt is not None:
+            t0 = time.perf_counter()
+            try:
+                df = run_progressive(db, sql_stmt, on_preview=on_preview, exact=exact)
+            except Exception:
+                df = None  # p.ej. el esquema cambió: se vuelve a preguntar al agente
+            if df is not None:
+                answer["sql"], answer["df"] = sql_stmt, df
+                timings["results"] = time.perf_counter() - t0
+                put_cached(question, sql_stmt, df)
+                timings["total"] = time.perf_counter() - t_start
+                return answer
+
+    # 🔒 Regla dura: si no hay año explícito y hay mes, añadimos el año más reciente con datos
+    consulta = infer_missing_year_from_query(question, db, intent=intent)
+    answer["query"] = consulta
+
+    # 🧩 Misma pregunta con otros literales (sede, año, mes, top...): plantilla SQL sin LLM
+    if use_cache:
+        t0 = time.perf_counter()
+        try:
+            hit = match_template(db, consulta, on_preview=on_preview, exact=exact)
+        except Exception:
+            hit = None  # plantilla inválida para este esquema: se pregunta al agente
+        timings["template"] = time.perf_counter() - t0
+        if hit is not None and not hit[1].empty:
+            answer["sql"], answer["df"] = hit
+            answer["template"] = True
+            put_cached(question, answer["sql"], answer["df"])
+            timings["total"] = time.perf_counter() - t_start
+            return answer
+
+    # 📚 Pares pregunta -> SQL verificados y parecidos como few-shot (menos iteraciones ReAct)
+    agent_input = consulta
+    if FEWSHOT_ENABLED:
+        t0 = time.perf_counter()
+        examples = get_example_store().search(consulta)
+        agent_input = build_fewshot_input(consulta, examples)
+        answer["fewshot"] = len(examples)
+        timings["retrieval"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    result = agent.invoke({"input": agent_input})
+    timings["agent"] = time.perf_counter() - t0
+
+    steps = result.get("intermediate_steps", [])
+    # Cada iteración ReAct es una llamada al LLM, más la respuesta final
+    # (la cascada de modelos ya suma las de todos los modelos que lo intentaron)
+    answer["llm_calls"] = result.get("llm_calls", len(steps) + 1)
+    answer["model"] = result.get("model_id")
+    answer["cascade"] = result.get("cascade", [])
+    sql_query, raw_results = extract_sql_and_results(steps)
+    answer["sql"] = sql_query
+
+    if sql_query is not None and raw_results is not None:
+        t0 = time.perf_counter()
+        df = results_to_dataframe(sql_query, raw_results)
+
+        # 🛟 Fallback: si salió vacío y el SQL trae un BETWEEN fuera de rango, parcheamos y re-ejecutamos
+        if df.empty and sql_query:
+            patched_sql = patch_sql_to_latest_year_if_out_of_range(sql_query, db)
+            if patched_sql and patched_sql != sql_query:
+                try:
+                    df2 = run_sql(db, patched_sql)
+                    if not df2.empty:
+                        df = df2
+                        answer["sql"] = patched_sql
+                        answer["patched"] = True
+                except Exception:
+                    # si falla el reintento seguimos con df vacío
+                    pass
+
+        answer["df"] = df.applymap(normalize_cell)
+        timings["results"] = time.perf_counter() - t0
+
+        if not answer["df"].empty:
+            put_cached(question, answer["sql"], answer["df"])
+            get_example_store().add(question, answer["sql"], len(answer["df"]))
+            if not answer["patched"]:
+                # la SQL parcheada ya no coincide con los literales de la pregunta
+                try:
+                    learn_template(db, consulta, answer["sql"])
+                except Exception:
+                    pass
+
+    timings["total"] = time.perf_counter() - t_start
+    return answer
@@ -1,61 +1,254 @@
+import re
+
+# ============= NORMALIZACIÓN (sin tildes, minúsculas) =============
+# translate 1:1 -> las posiciones del texto normalizado coinciden con el original
+_ACCENTS = str.maketrans("áéíóúüñàèìòùÁÉÍÓÚÜÑÀÈÌÒÙ", "aeiouunaeiouAEIOUUNAEIOU")
+
+
+def fold(text: str) -> str:
+    """Minúsculas y sin tildes: 'Medellín' -> 'medellin'."""
+    return (text or "").translate(_ACCENTS).lower()
+
+
+# ============= VOCABULARIOS =============
+MONTHS = {
+    "enero": 1, "febrero": 2, "marzo": 3, "abril": 4, "mayo": 5, "junio": 6,
+    "julio": 7, "agosto": 8, "septiembre": 9, "setiembre": 9, "octubre": 10,
+    "noviembre": 11, "diciembre": 12
+}
+
+# Palabras clave para cada tipo de salida (prioridad: file > plot > table)
+FILE_KEYWORDS = ["csv", "excel", "archivo", "exporta", "descarga", "guarda"]
+PLOT_KEYWORDS = ["grafico", "visualiza", "muestra", "dibuja", "plot", "chart"]
+
+# El orden define la prioridad (como el dict original de detect_aggregation)
+AGGREGATIONS = {
+    "suma": "sum",
+    "total": "sum",
+    "promedio": "mean",
+    "media": "mean",
+    "maximo": "max",
+    "minimo": "min",
+    "cuenta": "count",
+    "cantidad": "count"
+}
+
+DEFAULT_SEDES = [
+    "Armenia", "Barranquilla", "Bogotá", "Bucaramanga", "Cali", "Cartagena",
+    "Cúcuta", "Ibagué", "Manizales", "Medellín", "Montería", "Neiva", "Pasto",
+    "Pereira", "Popayán", "Santa Marta", "Sincelejo", "Tunja", "Valledupar",
+    "Villavicencio"
+]
+
+
+def _alternation(words):
+    # Más largas primero para que "santa marta" gane a "santa"
+    return "|".join(re.escape(w) for w in sorted(set(words), key=len, reverse=True))
+
+
+class IntentExtractor:
+    """
+    Extractor de intención en una sola pasada: un único regex compilado con grupos
+    nombrados recorre el prompt normalizado y rellena todos los campos a la vez.
+    """
+
+    def __init__(self, entities=None):
+        # entities: {"sede": [...], "producto": [...], "vendedor": [...]}
+        entities = entities if entities is not None else {"sede": DEFAULT_SEDES}
+
+        self._keywords = {}
+        for kw in FILE_KEYWORDS:
+            self._keywords[kw] = ("output", "file")
+        for kw in PLOT_KEYWORDS:
+            self._keywords[kw] = ("output", "plot")
+        for kw, agg in AGGREGATIONS.items():
+            self._keywords[kw] = ("agg", agg)
+        self._agg_priority = {kw: i for i, kw in enumerate(AGGREGATIONS)}
+
+        self._entities = {}
+        for kind, values in entities.items():
+            for value in values:
+                self._entities.setdefault(fold(value), (kind, value))
+        self.entity_kinds = list(entities)
+
+        parts = [
+            # Fechas explícitas primero (si no, el año de '2025-11-01' se leería suelto)
+            r"(?P<iso>\b(20\d{2})-(\d{1,2})-(\d{1,2})\b)",
+            r"(?P<dmy>\b(\d{1,2})/(\d{1,2})/(20\d{2})\b)",
+            r"(?P<year>\b20\d{2}\b)",
+            r"\btop\s*(?P<top>\d{1,4})\b",
+            r"\b(?P<topw>\d{1,4})\s+(?:mejores|primeros|principales|mayores)\b",
+            rf"\b(?P<month>{_alternation(MONTHS)})\b",
+        ]
+        if self._entities:
+            parts.append(rf"\b(?P<ent>{_alternation(self._entities)})\b")
+        # Igual que la versión original: coincidencia por prefijo ('totales' cuenta como 'total')
+        parts.append(rf"\b(?P<kw>{_alternation(self._keywords)})")
+        self._pattern = re.compile("|".join(parts))
+
+    def extract(self, prompt: str) -> dict:
+        """Devuelve la intención estructurada del prompt."""
+        text = fold(prompt)
+
+        months, years, dates = [], [], []
+        top_n = None
+        entities = {kind: [] for kind in self.entity_kinds}
+        outputs = set()
+        agg_kw = None
+        # (tipo, valor, inicio, fin) de cada literal, en orden de aparición
+        literals = []
+
+        for m in self._pattern.finditer(text):
+            group = m.lastgroup
+            if group == "iso":
+                y, mo, d = int(m.group(2)), int(m.group(3)), int(m.group(4))
+                dates.append(f"{y:04d}-{mo:02d}-{d:02d}")
+                _append_unique(years, y)
+                literals.append(("date", dates[-1], m.start(), m.end()))
+            elif group == "dmy":
+                d, mo, y = int(m.group(6)), int(m.group(7)), int(m.group(8))
+                dates.append(f"{y:04d}-{mo:02d}-{d:02d}")
+                _append_unique(years, y)
+                literals.append(("date", dates[-1], m.start(), m.end()))
+            elif group == "year":
+                _append_unique(years, int(m.group("year")))
+                literals.append(("year", int(m.group("year")), m.start(), m.end()))
+            elif group in ("top", "topw"):
+                if top_n is None:
+                    top_n = int(m.group(group))
+                literals.append(("top", int(m.group(group)), m.start(group), m.end(group)))
+            elif group == "month":
+                _append_unique(months, MONTHS[m.group("month")])
+                literals.append(("month", MONTHS[m.group("month")], m.start(), m.end()))
+            elif group == "ent":
+                kind, value = self._entities[m.group("ent")]
+                _append_unique(entities[kind], value)
+                literals.append((kind, value, m.start(), m.end()))
+            else:
+                kw = m.group("kw")
+                kind, value = self._keywords[kw]
+                if kind == "output":
+                    outputs.add(value)
+                elif agg_kw is None or self._agg_priority[kw] < self._agg_priority[agg_kw]:
+                    agg_kw = kw
+
+        if "file" in outputs:
+            output_type = "file"
+        elif "plot" in outputs:
+            output_type = "plot"
+        else:
+            output_type = "table"
+
+        # Fechas consecutivas -> rangos ("entre 2025-11-01 y 2025-11-30")
+        date_ranges = [(dates[i], dates[i + 1]) for i in range(0, len(dates) - 1, 2)]
+
+        return {
+            "output_type": output_type,
+            "aggregation": {
+                "needs_agg": agg_kw is not None,
+                "type": AGGREGATIONS[agg_kw] if agg_kw else None
+            },
+            "months": months,
+            "years": years,
+            "dates": dates,
+            "date_ranges": date_ranges,
+            "top_n": top_n,
+            "entities": entities,
+            "literals": literals,
+            "text": text
+        }
+
+    def extract_many(self, prompts):
+        """Versión batch: lista de intenciones, en el mismo orden."""
+        extract = self.extract
+        return [extract(p) for p in prompts]
+
+
+def _append_unique(items, value):
+    if value not in items:
+        items.append(value)
+
+
+def load_entities(db) -> dict:
+    """Valores distintos de sede/producto/vendedor en la BD (para IntentExtractor)."""
+    from sqlalchemy import text
+
+    entities = {}
+    with db._engine.connect() as conn:
+        for col in ("sede", "producto", "vendedor"):
+            rows = conn.execute(text(
+                f"SELECT DISTINCT {col} FROM ventas WHERE {col} IS NOT NULL"
+            )).fetchall()
+            entities[col] = [r[0] for r in rows]
+    return entities
+
+
+_default_extractor = None
+
+
+def get_extractor() -> IntentExtractor:
+    global _default_extractor
+    if _default_extractor is None:
+        _default_extractor = IntentExtractor()
+    return _default_extractor
+
+
+def extract_intent(prompt: str) -> dict:
+    """Intención estructurada en una sola pasada (ver IntentExtractor.extract)."""
+    return get_extractor().extract(prompt)
+
+
+def extract_intents(prompts, extractor=None):
+    """Clasifica en batch una lista de prompts (p.ej. todo el log de preguntas)."""
+    return (extractor or get_extractor()).extract_many(prompts)
+
+
+def intent_key(intent: dict) -> str:
+    """Clave estable de la intención, útil para agrupar tráfico o construir claves de caché."""
+    ents = ";".join(
+        f"{kind}={','.join(sorted(values))}"
+        for kind, values in sorted(intent["entities"].items()) if values
+    )
+    return "|".join([
+        intent["output_type"],
+        intent["aggregation"]["type"] or "-",
+        ",".join(map(str, intent["months"])) or "-",
+        ",".join(map(str, intent["years"])) or "-",
+        ",".join(f"{a}..{b}" for a, b in intent["date_ranges"]) or "-",
+        str(intent["top_n"] or "-"),
+        ents or "-",
+    ])
+
+
+def intent_signature(intent: dict) -> str:
+    """
+    Firma sin literales de la pregunta: el texto normalizado con cada literal
+    sustituido por su tipo ("top {top} productos en {sede} en {year}").
+    Preguntas con la misma firma tienen la misma SQL salvo por los literales.
+    """
+    text, parts, pos = intent["text"], [], 0
+    for kind, _, start, end in intent["literals"]:
+        parts.append(text[pos:start])
+        parts.append(f"{{{kind}}}")
+        pos = end
+    parts.append(text[pos:])
+    return " ".join("".join(parts).split())
+
+
+# ============= API ORIGINAL (ahora sobre el extractor) =============
 def detect_output_type(prompt: str) -> str:
     """Detecta el tipo de output deseado basado en el prompt"""
-    prompt_lower = prompt.lower()
-    
-    # Palabras clave para cada tipo
-    file_keywords = ["csv", "excel", "archivo", "exporta", "descarga", "guarda"]
-    plot_keywords = ["gráfico", "grafico", "visualiza", "muestra", "dibuja", "plot", "chart"]
-    
-    # Detectar tipo
-    if any(keyword in prompt_lower for keyword in file_keywords):
-        return "file"
-    elif any(keyword in prompt_lower for keyword in plot_keywords):
-        return "plot"
-    else:
-        return "table"
+    return extract_intent(prompt)["output_type"]
+
 
 def detect_aggregation(prompt: str) -> dict:
     """Detecta si se necesita agregación y de qué tipo"""
-    prompt_lower = prompt.lower()
-    
-    aggregations = {
-        "suma": "sum",
-        "total": "sum",
-        "promedio": "mean",
-        "media": "mean",
-        "máximo": "max",
-        "maximo": "max",
-        "mínimo": "min",
-        "minimo": "min",
-        "cuenta": "count",
-        "cantidad": "count"
-    }
-    
-    for key, value in aggregations.items():
-        if key in prompt_lower:
-            return {"needs_agg": True, "type": value}
-    
-    return {"needs_agg": False, "type": None}
+    return extract_intent(prompt)["aggregation"]
+
 
 def extract_time_range(prompt: str) -> dict:
     """Extrae rango de tiempo del prompt"""
-    import re
-    
-    months = {
-        "enero": "01", "febrero": "02", "marzo": "03", "abril": "04",
-        "mayo": "05", "junio": "06", "julio": "07", "agosto": "08",
-        "septiembre": "09", "octubre": "10", "noviembre": "11", "diciembre": "12"
-    }
-    
-    # Buscar mes
-    month = None
-    for month_name, month_num in months.items():
-        if month_name in prompt.lower():
-            month = month_num
-            break
-    
-    # Buscar año
-    year_match = re.search(r'20\d{2}', prompt)
-    year = year_match.group() if year_match else "2025"
-    
-    return {"month": month, "year": year}
\ No newline at end of file
+    intent = extract_intent(prompt)
+    month = f"{intent['months'][0]:02d}" if intent["months"] else None
+    year = str(intent["years"][0]) if intent["years"] else "2025"
+    return {"month": month, "year": year}
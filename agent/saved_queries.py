@@ -0,0 +1,426 @@
+import hashlib
+import os
+import re
+import threading
+import time
+
+from agent.actions import save_to_csv
+from agent.cache import normalize_question
+from agent.file_store import file_mtime, read_json, update_json
+from agent.sql_results import run_sql
+
+# 📌 Consultas guardadas en modo "watch":
+#   se guarda la SQL final de una pregunta y una marca de agua (MAX(id) de ventas).
+#   Cuando llegan filas nuevas, los agregados descomponibles (SUM, COUNT, MIN, MAX) se
+#   calculan solo sobre id > marca y se combinan con el resultado guardado; el resto de
+#   consultas se re-ejecutan completas. Supone `ventas` append-only (si desaparecen
+#   filas, se detecta por el COUNT y se recalcula todo).
+#   WATCH_ENABLED       -> "0" desactiva el hilo de refresco
+#   WATCH_INTERVAL      -> segundos entre comprobaciones de datos nuevos (MAX(id), por índice)
+#   WATCH_COUNT_EVERY   -> cada cuántas comprobaciones se hace el COUNT(*) completo que detecta borrados
+#   SAVED_QUERIES_PATH  -> JSON con las definiciones (pregunta + SQL)
+WATCH_ENABLED = os.getenv("WATCH_ENABLED", "1") != "0"
+WATCH_INTERVAL = float(os.getenv("WATCH_INTERVAL", "30"))
+WATCH_COUNT_EVERY = max(1, int(os.getenv("WATCH_COUNT_EVERY", "10")))
+SAVED_QUERIES_PATH = os.getenv("SAVED_QUERIES_PATH", "logs/consultas_guardadas.json")
+
+_lock = threading.Lock()
+_saved = None          # id -> definición + estado (el DataFrame solo vive en memoria)
+_saved_mtime = None
+_thread = None
+_thread_lock = threading.Lock()
+
+_AGG_RE = re.compile(r"^(SUM|COUNT|MIN|MAX)\s*\(\s*\)$", re.IGNORECASE)
+# Alias con o sin AS (se busca sobre la versión enmascarada: sin paréntesis ni comillas)
+_ALIAS_RE = re.compile(r"^(.*\S)\s+(?:AS\s+)?(\w+)\s*$", re.IGNORECASE | re.DOTALL)
+_ANY_AGG_RE = re.compile(
+    r"\b(SUM|COUNT|MIN|MAX|AVG|STDDEV\w*|VAR\w*|PERCENTILE\w*|STRING_AGG|ARRAY_AGG|BOOL_\w+)\s*\(",
+    re.IGNORECASE
+)
+_NOT_INCREMENTAL_RE = re.compile(
+    r"\b(JOIN|UNION|INTERSECT|EXCEPT|HAVING|LIMIT|OFFSET|FETCH|DISTINCT|WITH|OVER|TABLESAMPLE)\b",
+    re.IGNORECASE
+)
+_FROM_RE = re.compile(
+    r"\bFROM\s+(?:public\.)?ventas\b(?:\s+(?:AS\s+)?(?!WHERE\b|GROUP\b|ORDER\b)(\w+))?\s*",
+    re.IGNORECASE
+)
+
+
+# ============= ANÁLISIS DE LA SQL =============
+def _mask(sql: str) -> str:
+    """Misma longitud que `sql`, con el contenido de paréntesis y comillas en blanco."""
+    out, depth, quote = [], 0, None
+    for ch in sql:
+        if quote:
+            out.append(" ")
+            if ch == quote:
+                quote = None
+        elif ch in ("'", '"'):
+            quote = ch
+            out.append(" ")
+        elif ch == "(":
+            out.append("(" if depth == 0 else " ")
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+            out.append(")" if depth == 0 else " ")
+        else:
+            out.append(ch if depth == 0 else " ")
+    return "".join(out)
+
+
+def _split_top_level(text: str):
+    masked, parts, start = _mask(text), [], 0
+    for i, ch in enumerate(masked):
+        if ch == ",":
+            parts.append(text[start:i].strip())
+            start = i + 1
+    parts.append(text[start:].strip())
+    return parts
+
+
+def _parse(sql: str):
+    """
+    Estructura de una SELECT agregada sobre `ventas` que se puede refrescar por partes,
+    o None. Incluye el plan ("kinds" por columna y "order") y las posiciones de las cláusulas.
+    """
+    sql = sql.strip().rstrip(";")
+    masked = _mask(sql)
+    if not re.match(r"\s*SELECT\b", masked, re.IGNORECASE) or _NOT_INCREMENTAL_RE.search(masked):
+        return None
+
+    from_m = _FROM_RE.search(masked)
+    if from_m is None:
+        return None
+    where_m = re.compile(r"\bWHERE\b", re.IGNORECASE).search(masked, from_m.end())
+    group_m = re.compile(r"\bGROUP\s+BY\b", re.IGNORECASE).search(masked, from_m.end())
+    order_m = re.compile(r"\bORDER\s+BY\b", re.IGNORECASE).search(masked, from_m.end())
+    next_clause = min([m.start() for m in (where_m, group_m, order_m) if m] or [len(sql)])
+    if from_m.end() != next_clause:
+        return None  # FROM con varias tablas o algo no previsto
+
+    # Tipo de cada columna: clave de agrupación o agregado descomponible
+    items = _split_top_level(sql[re.match(r"\s*SELECT\b", masked, re.IGNORECASE).end():from_m.start()])
+    kinds, exprs, aliases = [], [], []
+    for item in items:
+        expr, alias = item, None
+        am = _ALIAS_RE.match(_mask(item))
+        if am and am.group(2).upper() not in ("END", "AS"):
+            expr, alias = item[:am.end(1)].strip(), am.group(2)
+            if expr.upper().endswith(" AS"):
+                expr = expr[:-3].strip()
+        elif item.endswith('"') and re.search(r'\s+(?:AS\s+)?"[^"]+"$', item, re.IGNORECASE):
+            qm = re.search(r'\s+(?:AS\s+)?"([^"]+)"$', item, re.IGNORECASE)
+            expr, alias = item[:qm.start()].strip(), qm.group(1)
+        agg = _AGG_RE.match(_mask(expr).strip())
+        if agg:
+            inner = expr[expr.index("(") + 1:expr.rindex(")")]
+            if re.match(r"\s*DISTINCT\b", inner, re.IGNORECASE):
+                return None
+            kinds.append(agg.group(1).lower())
+        elif _ANY_AGG_RE.search(expr):
+            return None  # AVG, ROUND(SUM(...)), FILTER...: no se combina por partes
+        else:
+            kinds.append("key")
+        exprs.append(" ".join(expr.lower().split()))
+        aliases.append(alias.lower() if alias else None)
+
+    if "key" in kinds and group_m is None:
+        return None
+    if all(k == "key" for k in kinds):
+        return None
+
+    def _position(ref):
+        """Columna de la salida a la que se refiere `ref` (posición, alias o expresión), o None."""
+        ref = " ".join(ref.lower().split()).strip('"')
+        if ref.isdigit() and 1 <= int(ref) <= len(items):
+            return int(ref) - 1
+        if ref in aliases:
+            return aliases.index(ref)
+        if ref in exprs:
+            return exprs.index(ref)
+        return None
+
+    # GROUP BY solo sobre claves de la salida: con una columna agrupada que no se devuelve
+    # (GROUP BY sede, producto con SELECT sede, ...) las filas no se pueden combinar por clave
+    if group_m:
+        group_end = order_m.start() if order_m and order_m.start() > group_m.end() else len(sql)
+        for part in _split_top_level(sql[group_m.end():group_end]):
+            pos = _position(part)
+            if pos is None or kinds[pos] != "key":
+                return None
+
+    # ORDER BY solo sobre columnas de la salida (alias, expresión o posición)
+    order = []
+    if order_m:
+        for part in _split_top_level(sql[order_m.end():]):
+            om = re.match(r"^(.*?)(?:\s+(ASC|DESC))?$", part, re.IGNORECASE | re.DOTALL)
+            pos = _position(om.group(1))
+            if pos is None:
+                return None
+            order.append((pos, (om.group(2) or "ASC").upper() == "ASC"))
+
+    clause_end = min([m.start() for m in (group_m, order_m) if m] or [len(sql)])
+    return {
+        "sql": sql,
+        "plan": {"kinds": kinds, "order": order},
+        "id_col": f"{from_m.group(1)}.id" if from_m.group(1) else "id",
+        "where_end": where_m.end() if where_m else None,
+        "clause_end": clause_end,
+    }
+
+
+def incremental_plan(sql: str):
+    """Plan de refresco incremental de la SQL (o None si hay que re-ejecutarla entera)."""
+    parsed = _parse(sql)
+    return parsed["plan"] if parsed else None
+
+
+def bounded_sql(sql: str, low=None, high=None) -> str:
+    """La misma SQL restringida a low < id <= high (para el delta o la base del resultado)."""
+    parsed = _parse(sql)
+    if parsed is None:
+        return sql
+    sql, id_col = parsed["sql"], parsed["id_col"]
+    conds = []
+    if low is not None:
+        conds.append(f"{id_col} > {int(low)}")
+    if high is not None:
+        conds.append(f"{id_col} <= {int(high)}")
+    if not conds:
+        return sql
+    cond = " AND ".join(conds)
+    end = parsed["clause_end"]
+    if parsed["where_end"] is not None:
+        where_end = parsed["where_end"]
+        return f"{sql[:where_end]} {cond} AND ({sql[where_end:end].strip()}) {sql[end:]}".rstrip()
+    return f"{sql[:end].rstrip()} WHERE {cond} {sql[end:]}".rstrip()
+
+
+def merge_results(old, delta, plan):
+    """Combina el resultado guardado con el de las filas nuevas según el plan."""
+    import pandas as pd
+
+    if delta is None or delta.empty:
+        return old
+    cols = list(old.columns)
+    delta = delta.set_axis(cols, axis=1)
+    combined = pd.concat([old, delta], ignore_index=True)
+    keys = [c for c, k in zip(cols, plan["kinds"]) if k == "key"]
+
+    def _combine(values, kind):
+        if kind in ("sum", "count"):
+            return values.sum(min_count=1)
+        return values.min() if kind == "min" else values.max()
+
+    if keys:
+        grouped = combined.groupby(keys, dropna=False, sort=False)
+        merged = pd.concat(
+            [_combine(grouped[c], k) for c, k in zip(cols, plan["kinds"]) if k != "key"], axis=1
+        ).reset_index()
+    else:
+        merged = pd.DataFrame([{c: _combine(combined[c], k) for c, k in zip(cols, plan["kinds"])}])
+
+    merged = merged[cols]
+    if plan["order"]:
+        merged = merged.sort_values(
+            [cols[pos] for pos, _ in plan["order"]],
+            ascending=[asc for _, asc in plan["order"]],
+            kind="mergesort",
+        )
+    return merged.reset_index(drop=True)
+
+
+# ============= ALMACÉN =============
+# El JSON lo comparten la UI y la API: se recarga cuando cambia su mtime y cada escritura
+# relee y modifica el archivo bajo un lock (agent/file_store.py) en vez de volcar _saved.
+def _load():
+    """id -> entrada, sincronizado con el archivo (conserva el estado en memoria de cada id)."""
+    global _saved, _saved_mtime
+    mtime = file_mtime(SAVED_QUERIES_PATH)
+    if _saved is None or mtime != _saved_mtime:
+        previous, _saved = _saved or {}, {}
+        for entry in read_json(SAVED_QUERIES_PATH, []):
+            try:
+                old = previous.get(entry["id"])
+                if old is not None and old["sql"] == entry["sql"]:
+                    _saved[entry["id"]] = old
+                else:
+                    # Sin resultado en memoria: el primer refresco lo recalcula entero.
+                    # El plan se recalcula por si cambiaron las reglas de incrementalidad
+                    _saved[entry["id"]] = {**entry, "plan": incremental_plan(entry["sql"]),
+                                           "df": None, "watermark": None}
+            except (KeyError, TypeError):
+                continue
+        _saved_mtime = mtime
+    return _saved
+
+
+def _store(update):
+    """Aplica update(lista de entradas del archivo) bajo el lock del archivo."""
+    try:
+        update_json(SAVED_QUERIES_PATH, [], update)
+    except OSError:
+        pass
+
+
+def saved_query_id(question: str) -> str:
+    return hashlib.sha1(normalize_question(question).encode("utf-8")).hexdigest()[:10]
+
+
+def list_saved():
+    """Copia de las consultas guardadas (para la UI/API)."""
+    with _lock:
+        return [dict(e) for e in _load().values()]
+
+
+def get_saved(entry_id: str):
+    with _lock:
+        entry = _load().get(entry_id)
+        return dict(entry) if entry else None
+
+
+def remove_saved(entry_id: str) -> bool:
+    with _lock:
+        removed = _load().pop(entry_id, None) is not None
+        if removed:
+            _store(lambda data: [e for e in data if e.get("id") != entry_id])
+    return removed
+
+
+def save_query(db, question: str, sql_stmt: str) -> dict:
+    """Guarda la pregunta con su SQL final y calcula el resultado base con su marca de agua."""
+    entry_id = saved_query_id(question)
+    entry = {
+        "id": entry_id,
+        "question": question,
+        "sql": sql_stmt.strip().rstrip(";"),
+        "plan": incremental_plan(sql_stmt),
+        "created_at": time.time(),
+    }
+    with _lock:
+        _load()[entry_id] = {**entry, "df": None, "watermark": None}
+        _store(lambda data: [e for e in data if e.get("id") != entry_id] + [entry])
+    refresh_saved(db, entry_id)
+    return get_saved(entry_id)
+
+
+# ============= REFRESCO =============
+def _table_state(db, with_count: bool = True):
+    """(MAX(id), filas totales o None). MAX(id) sale del índice de la PK; el COUNT(*) recorre la tabla."""
+    from sqlalchemy import text
+
+    with db._engine.connect() as conn:
+        high = conn.execute(text("SELECT MAX(id) FROM ventas")).scalar()
+        total = conn.execute(text("SELECT COUNT(*) FROM ventas")).scalar() if with_count else None
+    return int(high or 0), (int(total) if total is not None else None)
+
+
+def _rows_between(db, low, high) -> int:
+    """Filas con low < id <= high (recorrido del rango en el índice: barato para un delta)."""
+    from sqlalchemy import text
+
+    with db._engine.connect() as conn:
+        return int(conn.execute(text(
+            "SELECT COUNT(*) FROM ventas WHERE id > :low AND id <= :high"
+        ), {"low": low or 0, "high": high}).scalar())
+
+
+def refresh_saved(db, entry_id: str, force: bool = False, state=None):
+    """
+    Refresca una consulta guardada. Devuelve "unchanged", "incremental" o "full".
+    Sin cambios en la tabla no se ejecuta nada; con filas nuevas y plan se agregan solo esas.
+    `state` es el (MAX(id), COUNT o None) de _table_state, compartido por refresh_all;
+    sin COUNT no se comprueban borrados en esta pasada.
+    """
+    with _lock:
+        entry = _load().get(entry_id)
+        if entry is None:
+            return None
+        entry = dict(entry)
+
+    high, total = state if state is not None else _table_state(db)
+    have_base = entry["df"] is not None and entry["watermark"] is not None
+    if (have_base and not force and high == entry["watermark"]
+            and (total is None or total == entry["row_count"])):
+        return "unchanged"
+
+    t0 = time.perf_counter()
+    new_rows = _rows_between(db, entry["watermark"], high) if have_base else 0
+    append_only = have_base and (total is None or total == entry["row_count"] + new_rows)
+    if entry["plan"] and append_only and not force:
+        delta = run_sql(db, bounded_sql(entry["sql"], entry["watermark"], high))
+        df, mode = merge_results(entry["df"], delta, entry["plan"]), "incremental"
+        row_count = entry["row_count"] + new_rows
+    else:
+        # Con plan el resultado base se acota a id <= high para que el siguiente delta no duplique
+        sql_stmt = bounded_sql(entry["sql"], None, high) if entry["plan"] else entry["sql"]
+        df, mode = run_sql(db, sql_stmt), "full"
+        row_count = _rows_between(db, None, high)
+
+    entry.update({
+        "df": df,
+        "watermark": high,
+        "row_count": row_count,
+        "mode": mode,
+        "refresh_seconds": time.perf_counter() - t0,
+        "updated_at": time.time(),
+        "version": entry.get("version", 0) + 1,
+    })
+    # 📥 Copia estable en exported/ para quien consuma los archivos
+    try:
+        entry["export_path"] = save_to_csv(df, name=f"consulta_guardada_{entry_id}")
+    except OSError:
+        pass
+
+    with _lock:
+        if entry_id in _load():
+            _saved[entry_id] = entry
+    return mode
+
+
+def refresh_all(db, force: bool = False, check_deletes: bool = True):
+    """
+    Refresca todas las consultas guardadas; devuelve {id: modo o error}. El estado de la
+    tabla se lee una vez para todas; check_deletes=False se ahorra el COUNT(*) completo.
+    """
+    summary = {}
+    entries = list_saved()
+    if not entries:
+        return summary
+    state = _table_state(db, with_count=check_deletes)
+    for entry in entries:
+        try:
+            summary[entry["id"]] = refresh_saved(db, entry["id"], force=force, state=state)
+        except Exception as e:
+            summary[entry["id"]] = f"ERROR: {e}"
+    return summary
+
+
+def _watch_loop(db, interval):
+    rounds = 0
+    while True:
+        try:
+            refresh_all(db, check_deletes=rounds % WATCH_COUNT_EVERY == 0)
+        except Exception:
+            pass  # p.ej. BD caída: se reintenta en la siguiente vuelta
+        rounds += 1
+        time.sleep(interval)
+
+
+def start_background_watch(agent, db, interval: float = WATCH_INTERVAL):
+    """Arranca (una sola vez por proceso) el hilo que mantiene al día las consultas guardadas."""
+    global _thread
+    if not WATCH_ENABLED:
+        return None
+    with _thread_lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(
+                target=_watch_loop,
+                args=(db, interval),
+                name="saved-queries-watch",
+                daemon=True,
+            )
+            _thread.start()
+    return _thread
@@ -0,0 +1,114 @@
+import ast
+import re
+import datetime
+import decimal
+from typing import TYPE_CHECKING
+
+# pandas/sqlalchemy se importan al convertir o ejecutar, no al importar el módulo
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def extract_sql_and_results(steps):
+    """Extrae SQL y resultados tolerando reprs con datetime/Decimal."""
+    sql_query, raw_results = None, None
+
+    for action, response in reversed(steps or []):
+        if hasattr(action, "tool") and action.tool == "sql_db_query":
+            sql_query = action.tool_input
+
+            # 1) Si ya es lista/tuplas
+            if isinstance(response, list):
+                raw_results = response
+                break
+
+            # 2) Si es string, intentamos varias rutas
+            if isinstance(response, str):
+                # a) literal_eval directo
+                try:
+                    raw_results = ast.literal_eval(response)
+                    break
+                except Exception:
+                    pass
+                # b) aislar bloque [...] y literal_eval
+                try:
+                    m = re.search(r"\[.*\]", response, re.DOTALL)
+                    if m:
+                        raw_results = ast.literal_eval(m.group(0))
+                        break
+                except Exception:
+                    pass
+                # c) eval "seguro" con globals limitados
+                try:
+                    safe_globals = {
+                        "__builtins__": {},
+                        "datetime": datetime,
+                        "Decimal": decimal.Decimal,
+                    }
+                    raw_results = eval(response, safe_globals, {})
+                    if isinstance(raw_results, (list, tuple)):
+                        raw_results = list(raw_results)
+                        break
+                except Exception:
+                    pass
+
+            # 3) último recurso
+            try:
+                raw_results = list(response)
+                break
+            except Exception:
+                raw_results = None
+            break
+
+    return sql_query, raw_results
+
+
+def normalize_cell(v):
+    if isinstance(v, decimal.Decimal):
+        return float(v)
+    if isinstance(v, (datetime.datetime, datetime.date)):
+        try:
+            return v.date() if hasattr(v, "date") else v
+        except Exception:
+            return str(v)
+    return v
+
+
+def results_to_dataframe(sql_query, raw_results):
+    """Convierte resultados a DataFrame con nombres de columnas correctos."""
+    import pandas as pd
+
+    if not raw_results:
+        return pd.DataFrame()
+
+    try:
+        select_section = sql_query.upper().split("SELECT")[1].split("FROM")[0]
+        columns = []
+        for col in select_section.split(","):
+            col = col.strip()
+            if " AS " in col.upper():
+                columns.append(col.split(" AS ")[-1].strip())
+            else:
+                columns.append(col.split(".")[-1].strip())
+
+        df = pd.DataFrame.from_records(raw_results, columns=columns)
+        df = df.applymap(normalize_cell)
+        df.columns = [col.replace('"', '').replace('`', '').strip().upper() for col in df.columns]
+        return df
+    except Exception:
+        if raw_results and len(raw_results) > 0:
+            num_cols = len(raw_results[0]) if isinstance(raw_results[0], (list, tuple)) else 1
+            columns = [f"COLUMNA_{i+1}" for i in range(num_cols)]
+            return pd.DataFrame(raw_results, columns=columns)
+        return pd.DataFrame()
+
+
+def run_sql(db, sql_stmt: str) -> "pd.DataFrame":
+    """Ejecuta SQL directo contra la BD y normaliza igual que los resultados del agente."""
+    import pandas as pd
+    from sqlalchemy import text
+
+    with db._engine.connect() as conn:
+        df = pd.read_sql_query(text(sql_stmt), conn)
+    df.columns = [c.replace('"', '').replace('`', '').strip().upper() for c in df.columns]
+    return df.applymap(normalize_cell)
@@ -0,0 +1,339 @@
+import calendar
+import datetime
+import hashlib
+import os
+import re
+import threading
+import time
+
+from agent.approx import run_progressive
+from agent.file_store import file_mtime, read_json, update_json
+from agent.query_parser import IntentExtractor, fold, intent_signature, load_entities
+from agent.sql_results import normalize_cell
+
+# 🧩 Caché de plantillas SQL parametrizadas:
+#   firma sin literales de la pregunta -> SQL con los literales (sede, producto, vendedor,
+#   fechas, años, meses, LIMIT) convertidos en parámetros. Una pregunta nueva con la misma
+#   firma se resuelve enlazando sus literales, sin llamar al LLM.
+#   SQL_TEMPLATES_ENABLED -> "0" desactiva la caché de plantillas
+#   SQL_TEMPLATES_PATH    -> JSON donde se persisten las plantillas
+#   ENTITY_TTL            -> segundos que se reutilizan los valores distintos de la tabla
+SQL_TEMPLATES_ENABLED = os.getenv("SQL_TEMPLATES_ENABLED", "1") != "0"
+SQL_TEMPLATES_PATH = os.getenv("SQL_TEMPLATES_PATH", "logs/sql_templates.json")
+ENTITY_TTL = float(os.getenv("ENTITY_TTL", "600"))
+
+ENTITY_KINDS = ("sede", "producto", "vendedor")
+
+_lock = threading.Lock()
+_templates = None
+_templates_mtime = None
+_entities_cache = {}
+
+# Literales de la SQL: 'texto' (opcionalmente DATE '...') o enteros sueltos
+_LITERAL_RE = re.compile(
+    r"(?P<typed>\b(?:DATE|TIMESTAMP)\s+)?'(?P<str>(?:[^']|'')*)'|(?<![\w.$:])(?P<int>\d+)(?![\w.])",
+    re.IGNORECASE
+)
+_ISO_DATE_RE = re.compile(r"^(\d{4})-(\d{2})-(\d{2})$")
+_DATE_PREFIX_RE = re.compile(r"^\d{4}-\d{1,2}")
+_PLACEHOLDER_RE = re.compile(r"(?<!:):tpl_(\d+)\b")
+
+
+# ============= VOCABULARIO (valores distintos de la tabla) =============
+def _extractor(db):
+    """Extractor con los valores reales de sede/producto/vendedor de la BD, con TTL."""
+    key = id(db)
+    hit = _entities_cache.get(key)
+    if hit is not None and time.time() - hit[0] < ENTITY_TTL:
+        return hit[1]
+    extractor = IntentExtractor(load_entities(db))
+    _entities_cache[key] = (time.time(), extractor)
+    return extractor
+
+
+def _literals_by_kind(intent):
+    lits = {}
+    for kind, value, _, _ in intent["literals"]:
+        lits.setdefault(kind, []).append(value)
+    return lits
+
+
+# ============= PARAMETRIZACIÓN =============
+def _last_day(year, month):
+    return calendar.monthrange(year, month)[1]
+
+
+def _next_month(year, month):
+    return (year, month + 1) if month < 12 else (year + 1, 1)
+
+
+def _derive_date(y, mo, day, lits):
+    """
+    Fecha de la SQL como cota del periodo de la pregunta: (spec, literales usados) o None.
+      - primer/último día de un (año, mes) de la pregunta
+      - primer día del mes siguiente (rango semiabierto: fecha < '2024-10-01')
+      - sin mes en la pregunta: 1-ene / 31-dic del año, o 1-ene del año siguiente
+    """
+    years, months = lits.get("year", []), lits.get("month", [])
+    if y in years and mo in months and day in (1, _last_day(y, mo)):
+        yi, mi = years.index(y), months.index(mo)
+        return ({"kind": "derived_date", "year": {"idx": yi}, "month": {"idx": mi},
+                 "day": 1 if day == 1 else "last", "shift": None}, {("year", yi), ("month", mi)})
+    if day == 1:
+        prev = (y, mo - 1) if mo > 1 else (y - 1, 12)
+        if prev[0] in years and prev[1] in months:
+            yi, mi = years.index(prev[0]), months.index(prev[1])
+            return ({"kind": "derived_date", "year": {"idx": yi}, "month": {"idx": mi},
+                     "day": 1, "shift": "month"}, {("year", yi), ("month", mi)})
+    if not months:
+        if y in years and (mo, day) in ((1, 1), (12, 31)):
+            yi = years.index(y)
+            return ({"kind": "derived_date", "year": {"idx": yi}, "month": {"const": mo},
+                     "day": day, "shift": None}, {("year", yi)})
+        if y - 1 in years and (mo, day) == (1, 1):
+            yi = years.index(y - 1)
+            return ({"kind": "derived_date", "year": {"idx": yi}, "month": {"const": 1},
+                     "day": 1, "shift": "year"}, {("year", yi)})
+    return None
+
+
+def _period_bounds(year, month=None):
+    """(inicio, último día, inicio del periodo siguiente) de un mes o de un año."""
+    if month is None:
+        return datetime.date(year, 1, 1), datetime.date(year, 12, 31), datetime.date(year + 1, 1, 1)
+    ny, nm = _next_month(year, month)
+    return (datetime.date(year, month, 1), datetime.date(year, month, _last_day(year, month)),
+            datetime.date(ny, nm, 1))
+
+
+def period_matches(template: dict, values, intent: dict) -> bool:
+    """Las fechas derivadas enlazadas delimitan exactamente el periodo que pide la pregunta."""
+    derived = {v for spec, v in zip(template["params"], values) if spec["kind"] == "derived_date"}
+    if not derived:
+        return True
+    years, months = intent["years"], intent["months"]
+    if not years:
+        return False
+    periods = [_period_bounds(y, m) for y in years for m in (months or [None])]
+    if len(periods) == 1:
+        start, last, following = periods[0]
+        if not derived <= {start, last, following}:
+            return False
+        # Con las dos cotas: [inicio, último] o [inicio, siguiente)
+        return len(derived) < 2 or (min(derived) == start and max(derived) in (last, following))
+    # Varios meses/años: cada cota tiene que ser inicio o fin de alguno de ellos
+    return derived <= {d for bounds in periods for d in bounds}
+
+
+def parametrize(sql: str, intent: dict):
+    """
+    Sustituye en la SQL los literales que vienen de la pregunta por parámetros :tpl_N.
+    Devuelve {"sql", "params"} o None si algún literal de la pregunta no aparece en la SQL
+    (entonces la plantilla no sería fiable).
+    """
+    lits = _literals_by_kind(intent)
+    folded = {kind: [fold(v) for v in lits.get(kind, [])] for kind in ENTITY_KINDS}
+    params, used, fixed_dates = [], set(), []
+
+    def _index(kind, value):
+        values = lits.get(kind, [])
+        return values.index(value) if value in values else None
+
+    def _param(spec, typed=False):
+        params.append(spec)
+        ph = f":tpl_{len(params) - 1}"
+        return f"CAST({ph} AS DATE)" if typed else ph
+
+    def _sub(m):
+        if m.group("int") is not None:
+            n = int(m.group("int"))
+            before = m.string[max(0, m.start() - 40):m.start()].upper()
+            idx = _index("year", n)
+            if idx is not None:
+                used.add(("year", idx))
+                return _param({"kind": "year", "idx": idx})
+            idx = _index("top", n)
+            if idx is not None and before.rstrip().endswith("LIMIT"):
+                used.add(("top", idx))
+                return _param({"kind": "top", "idx": idx})
+            idx = _index("month", n)
+            if idx is not None and "MONTH" in before:
+                used.add(("month", idx))
+                return _param({"kind": "month", "idx": idx})
+            return m.group(0)
+
+        content = m.group("str").replace("''", "'")
+        typed = bool(m.group("typed"))
+        d = _ISO_DATE_RE.match(content)
+        if d:
+            if content in lits.get("date", []):
+                idx = lits["date"].index(content)
+                used.add(("date", idx))
+                return _param({"kind": "date", "idx": idx}, typed=typed)
+            derived = _derive_date(*map(int, d.groups()), lits)
+            if derived is None:
+                # Fecha fija que no sale de la pregunta: al re-enlazar daría otro periodo
+                fixed_dates.append(content)
+                return m.group(0)
+            spec, spec_used = derived
+            used.update(spec_used)
+            return _param(spec, typed=typed)
+        if _DATE_PREFIX_RE.match(content):
+            fixed_dates.append(content)  # timestamps, '2024-09': no se re-enlazan
+            return m.group(0)
+
+        # Entidades (también dentro de LIKE '%...%')
+        inner = content.strip("%")
+        prefix = content[:len(content) - len(content.lstrip("%"))]
+        suffix = content[len(content.rstrip("%")):]
+        for kind in ENTITY_KINDS:
+            if fold(inner) in folded[kind]:
+                idx = folded[kind].index(fold(inner))
+                used.add((kind, idx))
+                return _param({"kind": kind, "idx": idx, "wrap": [prefix, suffix]}, typed=typed)
+        return m.group(0)
+
+    template_sql = _LITERAL_RE.sub(_sub, sql.strip().rstrip(";"))
+
+    needed = {(kind, i) for kind, values in lits.items() for i in range(len(values))}
+    if fixed_dates or not needed <= used:
+        return None
+    return {"sql": template_sql, "params": params}
+
+
+def bind(template: dict, intent: dict):
+    """Valores de los parámetros para una pregunta nueva; None si no encajan."""
+    lits = _literals_by_kind(intent)
+    values = []
+    try:
+        for spec in template["params"]:
+            kind = spec["kind"]
+            if kind == "derived_date":
+                y = lits["year"][spec["year"]["idx"]]
+                mo = spec["month"]["const"] if "const" in spec["month"] else lits["month"][spec["month"]["idx"]]
+                shift = spec.get("shift")
+                if shift == "month":
+                    y, mo = _next_month(y, mo)
+                elif shift == "year":
+                    y += 1
+                day = _last_day(y, mo) if spec["day"] == "last" else spec["day"]
+                values.append(datetime.date(y, mo, day))
+            elif kind == "date":
+                values.append(datetime.date.fromisoformat(lits["date"][spec["idx"]]))
+            elif kind in ENTITY_KINDS:
+                # El extractor solo reconoce valores que existen en `ventas` (load_entities)
+                prefix, suffix = spec.get("wrap") or ["", ""]
+                values.append(f"{prefix}{lits[kind][spec['idx']]}{suffix}")
+            else:
+                values.append(int(lits[kind][spec["idx"]]))
+    except (KeyError, IndexError, ValueError):
+        return None
+    if not period_matches(template, values, intent):
+        return None
+    return values
+
+
+def render_sql(template: dict, values) -> str:
+    """SQL con los valores en línea (para mostrar y para la caché de preguntas)."""
+    def _lit(v):
+        if isinstance(v, int):
+            return str(v)
+        return "'" + str(v).replace("'", "''") + "'"
+    return _PLACEHOLDER_RE.sub(lambda m: _lit(values[int(m.group(1))]), template["sql"])
+
+
+# ============= EJECUCIÓN (SENTENCIAS PREPARADAS) =============
+def execute_template(db, template: dict, values):
+    """
+    Ejecuta la plantilla como sentencia preparada (PREPARE una vez por conexión, luego
+    EXECUTE). Si el servidor la rechaza se usa la misma SQL con parámetros enlazados.
+    """
+    import pandas as pd
+    from sqlalchemy import text
+
+    name = "tpl_" + hashlib.sha1(template["sql"].encode("utf-8")).hexdigest()[:16]
+    pg_sql = _PLACEHOLDER_RE.sub(lambda m: f"${int(m.group(1)) + 1}", template["sql"])
+
+    with db._engine.connect() as conn:
+        prepared = conn.info.setdefault("prepared_templates", set())
+        try:
+            if name not in prepared:
+                # Sin parámetros: que psycopg2 no lea los '%' de un LIKE como marcadores
+                conn.exec_driver_sql(f"PREPARE {name} AS {pg_sql}",
+                                     execution_options={"no_parameters": True})
+                prepared.add(name)
+            if values:
+                result = conn.exec_driver_sql(
+                    f"EXECUTE {name}({', '.join(['%s'] * len(values))})", tuple(values)
+                )
+            else:
+                result = conn.exec_driver_sql(f"EXECUTE {name}")
+        except Exception:
+            conn.rollback()
+            prepared.discard(name)
+            result = conn.execute(
+                text(template["sql"]), {f"tpl_{i}": v for i, v in enumerate(values)}
+            )
+        df = pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+
+    df.columns = [c.replace('"', '').replace('`', '').strip().upper() for c in df.columns]
+    return df.applymap(normalize_cell)
+
+
+# ============= ALMACÉN =============
+# La UI y la API comparten el JSON: se recarga si cambia su mtime y cada plantilla nueva se
+# añade releyendo el archivo bajo un lock, sin pisar las que aprendió el otro proceso.
+def _load():
+    global _templates, _templates_mtime
+    mtime = file_mtime(SQL_TEMPLATES_PATH)
+    if _templates is None or mtime != _templates_mtime:
+        data = read_json(SQL_TEMPLATES_PATH, {})
+        _templates = data if isinstance(data, dict) else {}
+        _templates_mtime = mtime
+    return _templates
+
+
+def _save(signature: str, template: dict):
+    try:
+        update_json(SQL_TEMPLATES_PATH, {}, lambda data: {**data, signature: template})
+    except OSError:
+        pass
+
+
+def learn_template(db, question: str, sql_stmt: str):
+    """Guarda la plantilla de una respuesta verificada (SQL con filas). Devuelve la firma o None."""
+    if not SQL_TEMPLATES_ENABLED or not sql_stmt:
+        return None
+    intent = _extractor(db).extract(question)
+    template = parametrize(sql_stmt, intent)
+    # La propia pregunta tiene que reproducir su periodo (si no, la SQL no encaja con ella)
+    if template is None or bind(template, intent) is None:
+        return None
+    signature = intent_signature(intent)
+    with _lock:
+        _load()[signature] = template
+        _save(signature, template)
+    return signature
+
+
+def match_template(db, question: str, on_preview=None, exact: bool = False):
+    """
+    Si hay una plantilla para la firma de la pregunta, devuelve (sql_mostrada, df);
+    si no (o los literales no son válidos), None. on_preview/exact como en run_progressive.
+    """
+    if not SQL_TEMPLATES_ENABLED:
+        return None
+    intent = _extractor(db).extract(question)
+    with _lock:
+        template = _load().get(intent_signature(intent))
+    if template is None:
+        return None
+    values = bind(template, intent)
+    if values is None:
+        return None
+    sql_shown = render_sql(template, values)
+    df = run_progressive(
+        db, sql_shown, on_preview=on_preview, exact=exact,
+        execute=lambda: execute_template(db, template, values)
+    )
+    return sql_shown, df
@@ -0,0 +1,129 @@
+# agent/startup_profile.py
+# Perfil de arranque: tiempo de import por módulo (en un proceso limpio) y de init del agente.
+#
+# Uso:
+#   python -m agent.startup_profile                 # módulos de agent/ (--heavy añade las dependencias pesadas)
+#   python -m agent.startup_profile --init          # además construye el agente (BD + Bedrock)
+#   python -m agent.startup_profile --budget-ms 500 # código de salida 1 si se excede el presupuesto
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+
+# Módulos propios que se importan al arrancar la UI/API (deben ser baratos)
+APP_MODULES = [
+    "agent.actions",
+    "agent.approx",
+    "agent.cache",
+    "agent.date_rules",
+    "agent.example_store",
+    "agent.examples",
+    "agent.langchain_agent",
+    "agent.model_cascade",
+    "agent.pipeline",
+    "agent.query_parser",
+    "agent.saved_queries",
+    "agent.sql_results",
+    "agent.sql_templates",
+    "agent.warmup",
+]
+
+# Dependencias pesadas, como referencia de lo que cuesta importarlas
+HEAVY_MODULES = [
+    "pandas",
+    "sqlalchemy",
+    "altair",
+    "matplotlib.pyplot",
+    "boto3",
+    "langchain.agents",
+    "langchain_community.chat_models",
+]
+
+_IMPORTTIME_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def import_time(module: str, cwd: str = None):
+    """
+    Importa `module` en un intérprete limpio con -X importtime.
+    Devuelve (ms_acumulados, [(ms, submódulo) más caros]) o (None, error).
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=cwd,
+        env={**os.environ, "PYTHONPATH": cwd or os.getcwd()},
+    )
+    if proc.returncode != 0:
+        last = (proc.stderr.strip().splitlines() or ["error"])[-1]
+        return None, last
+
+    entries = []
+    for line in proc.stderr.splitlines():
+        m = _IMPORTTIME_RE.match(line)
+        if m:
+            entries.append((int(m.group(2)), len(m.group(3)), m.group(4)))
+
+    # -X importtime lista los hijos ANTES del padre y con más sangría
+    total_us, children = 0, []
+    for i in range(len(entries) - 1, -1, -1):
+        cumulative, indent, name = entries[i]
+        if name != module:
+            continue
+        total_us = cumulative
+        for child_us, child_indent, child_name in reversed(entries[:i]):
+            if child_indent <= indent:
+                break
+            if child_indent == indent + 2:
+                # dependencias de primer nivel (las que arrastra directamente el módulo)
+                children.append((child_us / 1000, child_name))
+        break
+    children.sort(reverse=True)
+    return total_us / 1000, children[:3]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perfil de tiempo de arranque")
+    parser.add_argument("modules", nargs="*", help="Módulos a medir (por defecto los de la app)")
+    parser.add_argument("--heavy", action="store_true", help="Incluye las dependencias pesadas")
+    parser.add_argument("--init", action="store_true", help="Mide también get_agent_and_db()")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", "0")),
+                        help="Presupuesto de import por módulo de la app (0 = sin límite)")
+    args = parser.parse_args(argv)
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    modules = args.modules or APP_MODULES + (HEAVY_MODULES if args.heavy else [])
+
+    print("\n=== Tiempo de import (proceso limpio) ===\n")
+    over_budget = []
+    for module in modules:
+        ms, detail = import_time(module, cwd=root)
+        if ms is None:
+            print(f"{module:35s}      ERROR  {detail}")
+            continue
+        deps = ", ".join(f"{name} {dep_ms:.0f}ms" for dep_ms, name in detail)
+        flag = ""
+        if args.budget_ms and module in APP_MODULES and ms > args.budget_ms:
+            over_budget.append(module)
+            flag = "  ⚠️ fuera de presupuesto"
+        print(f"{module:35s} {ms:8.1f}ms  {deps}{flag}")
+
+    if args.init:
+        from agent.langchain_agent import INIT_TIMINGS, get_agent_and_db
+
+        print("\n=== Inicialización del agente ===\n")
+        t0 = time.perf_counter()
+        get_agent_and_db()
+        total = time.perf_counter() - t0
+        for step, secs in INIT_TIMINGS.items():
+            print(f"{step:35s} {secs * 1000:8.1f}ms")
+        print(f"{'total':35s} {total * 1000:8.1f}ms")
+
+    if over_budget:
+        print(f"\n❌ {len(over_budget)} módulo(s) superan {args.budget_ms:.0f}ms: {', '.join(over_budget)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
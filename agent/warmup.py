@@ -0,0 +1,203 @@
+import os
+import threading
+import time
+
+from agent.approx import APPROX_SAMPLE_TABLE, refresh_sample_table
+from agent.cache import get_cached_sql, normalize_question, put_cached, top_questions
+from agent.examples import EXAMPLES
+from agent.file_store import file_mtime, read_json, update_json
+from agent.pipeline import answer_question
+from agent.sql_results import extract_sql_and_results, run_sql
+
+# ⚙️ Configuración por variables de entorno
+#   WARMUP_ENABLED   -> "0" desactiva el precalentamiento
+#   WARMUP_TOP_N     -> cuántas preguntas del historial añadir a los ejemplos
+#   WARMUP_INTERVAL  -> cada cuántos segundos se recalculan los resultados aunque no cambien los datos
+#   WARMUP_POLL      -> cada cuántos segundos se mira si llegaron datos nuevos (MAX(id), por índice)
+#   WARMUP_COUNT_EVERY -> cada cuántas comprobaciones se hace además el COUNT(*) completo (borrados)
+#   WARMUP_LOCK_KEY  -> clave del advisory lock de Postgres que elige el único proceso (UI o API)
+#                       que resuelve preguntas con el LLM y reconstruye la muestra
+#   WARMUP_SQL_PATH  -> JSON pregunta -> SQL que publica ese proceso; los demás ejecutan esas SQL
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") != "0"
+WARMUP_TOP_N = int(os.getenv("WARMUP_TOP_N", "10"))
+WARMUP_INTERVAL = float(os.getenv("WARMUP_INTERVAL", "3600"))
+WARMUP_POLL = float(os.getenv("WARMUP_POLL", "60"))
+WARMUP_COUNT_EVERY = max(1, int(os.getenv("WARMUP_COUNT_EVERY", "10")))
+WARMUP_LOCK_KEY = int(os.getenv("WARMUP_LOCK_KEY", "7261"))
+WARMUP_SQL_PATH = os.getenv("WARMUP_SQL_PATH", "logs/warmup_sql.json")
+
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def warmup_questions(top_n: int = WARMUP_TOP_N):
+    """Ejemplos configurados + top-N del historial, sin duplicados y en orden."""
+    questions = []
+    seen = set()
+    for q in list(EXAMPLES) + top_questions(top_n):
+        key = " ".join(q.lower().split())
+        if key not in seen:
+            seen.add(key)
+            questions.append(q)
+    return questions
+
+
+def data_fingerprint(db, with_count: bool = False):
+    """(MAX(id), COUNT(*) o None). MAX(id) sale del índice de la PK; el COUNT recorre la tabla."""
+    from sqlalchemy import text
+
+    with db._engine.connect() as conn:
+        high = conn.execute(text("SELECT MAX(id) FROM ventas")).scalar()
+        total = conn.execute(text("SELECT COUNT(*) FROM ventas")).scalar() if with_count else None
+    return high, total
+
+
+def shared_sql():
+    """Pregunta normalizada -> SQL resuelta por el proceso que precalienta con el LLM."""
+    return read_json(WARMUP_SQL_PATH, {})
+
+
+def publish_sql(resolved: dict):
+    """Añade pares pregunta -> SQL al archivo compartido (para los procesos sin el lock)."""
+    if not resolved:
+        return
+    try:
+        update_json(WARMUP_SQL_PATH, {}, lambda data: {
+            **data, **{normalize_question(q): sql for q, sql in resolved.items()}
+        })
+    except OSError:
+        pass
+
+
+def resolve_question(agent, question: str):
+    """Pregunta -> SQL usando el agente (la llamada cara al LLM)."""
+    out = agent.invoke({"input": question})
+    sql_stmt, _ = extract_sql_and_results(out.get("intermediate_steps", []))
+    return sql_stmt
+
+
+def warm_up(agent, db, questions=None, refresh_only=False):
+    """
+    Resuelve cada pregunta a SQL (si no estaba en caché), la ejecuta y guarda SQL + resultado.
+    Con refresh_only=True no llama al LLM: solo re-ejecuta las SQL ya conocidas (en este
+    proceso o publicadas en WARMUP_SQL_PATH). Sin refresh_only publica las SQL resueltas.
+    Los resultados vacíos no se cachean. Devuelve una lista de (pregunta, estado, filas, segundos).
+    """
+    summary, resolved = [], {}
+    shared = shared_sql()
+    for question in questions or warmup_questions():
+        t0 = time.time()
+        try:
+            sql_stmt = get_cached_sql(question) or shared.get(normalize_question(question))
+            if sql_stmt is None:
+                if refresh_only:
+                    continue
+                # Mismo pipeline que una consulta (año inferido, parche de fechas, few-shot...):
+                # ya cachea la respuesta si tiene filas
+                answer = answer_question(agent, db, question, use_cache=False)
+                status = "OK" if not answer["df"].empty else ("EMPTY" if answer["sql"] else "NO_SQL")
+                if status == "OK":
+                    resolved[question] = answer["sql"]
+                summary.append((question, status, len(answer["df"]), time.time() - t0))
+                continue
+            df = run_sql(db, sql_stmt)
+            if df.empty:
+                summary.append((question, "EMPTY", 0, time.time() - t0))
+                continue
+            put_cached(question, sql_stmt, df)
+            resolved[question] = sql_stmt
+            summary.append((question, "OK", len(df), time.time() - t0))
+        except Exception as e:
+            summary.append((question, f"ERROR: {e}", 0, time.time() - t0))
+    if not refresh_only:
+        publish_sql(resolved)
+    return summary
+
+
+def _refresh_sample(db):
+    if APPROX_SAMPLE_TABLE:
+        try:
+            refresh_sample_table(db)
+        except Exception:
+            pass
+
+
+def _acquire_leader(db):
+    """
+    Conexión que retiene el advisory lock del warm-up, o None si lo tiene otro proceso.
+    El lock es de sesión: se libera solo si el proceso (o la conexión) muere.
+    """
+    from sqlalchemy import text
+
+    try:
+        conn = db._engine.connect()
+    except Exception:
+        return None
+    try:
+        got = conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": WARMUP_LOCK_KEY}).scalar()
+        conn.commit()  # el lock sigue tomado; la conexión no queda "idle in transaction"
+    except Exception:
+        got = False
+    if not got:
+        conn.close()
+        return None
+    return conn
+
+
+def _warmup_loop(agent, db, interval, poll):
+    # 👑 Solo un proceso (UI o API) llama al LLM, publica las SQL en WARMUP_SQL_PATH y
+    # reconstruye la muestra; los demás ejecutan las SQL publicadas (cada uno tiene su
+    # caché en memoria) y toman el relevo si el líder cae
+    leader = _acquire_leader(db)
+    last_full, last_shared = 0.0, None
+    try:
+        last_high, last_total = data_fingerprint(db, with_count=True)
+    except Exception:
+        last_high = last_total = None
+
+    rounds = 0
+    while True:
+        if leader is None:
+            leader = _acquire_leader(db)
+        if leader is not None and time.time() - last_full >= interval:
+            # ⏰ Precalentamiento completo (incluye preguntas nuevas del top-N)
+            _refresh_sample(db)
+            warm_up(agent, db)
+            last_full = time.time()
+        elif leader is None and file_mtime(WARMUP_SQL_PATH) != last_shared:
+            # 📨 El líder publicó SQL nuevas: se ejecutan sin llamar al LLM
+            last_shared = file_mtime(WARMUP_SQL_PATH)
+            warm_up(agent, db, refresh_only=True)
+
+        time.sleep(poll)
+        rounds += 1
+        try:
+            high, total = data_fingerprint(db, with_count=rounds % WARMUP_COUNT_EVERY == 0)
+        except Exception:
+            continue
+        changed = high != last_high or (total is not None and total != last_total)
+        last_high = high
+        if total is not None:
+            last_total = total
+        if changed:
+            # 📥 Llegaron (o desaparecieron) datos: basta con re-ejecutar las SQL conocidas
+            if leader is not None:
+                _refresh_sample(db)
+            warm_up(agent, db, refresh_only=True)
+
+
+def start_background_warmup(agent, db, interval: float = WARMUP_INTERVAL, poll: float = WARMUP_POLL):
+    """Arranca (una sola vez por proceso) el hilo de precalentamiento."""
+    global _thread
+    if not WARMUP_ENABLED:
+        return None
+    with _thread_lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(
+                target=_warmup_loop,
+                args=(agent, db, interval, poll),
+                name="cache-warmup",
+                daemon=True,
+            )
+            _thread.start()
+    return _thread
@@ -0,0 +1,318 @@
+# api/server.py
+# API HTTP/JSON sin Streamlit para el pipeline NL -> SQL -> DB.
+# Uso: python -m api.server   (escucha en API_HOST:API_PORT, por defecto 0.0.0.0:8000)
+import asyncio
+import io
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from aiohttp import web
+
+from agent.cache import log_question, normalize_question
+from agent.langchain_agent import get_shared_agent_and_db, init_in_background
+from agent.pipeline import answer_question
+from agent.saved_queries import get_saved, list_saved, remove_saved, save_query, start_background_watch
+from agent.warmup import start_background_warmup
+
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+API_WORKERS = int(os.getenv("API_WORKERS", "8"))          # hilos para agente/BD (bloqueantes)
+API_KEEPALIVE = float(os.getenv("API_KEEPALIVE", "75"))   # segundos de keep-alive HTTP
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "100"))
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "50000"))
+
+_dumps = partial(json.dumps, default=str, ensure_ascii=False)
+
+
+# ============= CONVERSIÓN =============
+def dataframe_payload(df):
+    """DataFrame -> columnas tipadas + filas (listas) serializables a JSON."""
+    columns = [{"name": str(c), "dtype": str(t)} for c, t in df.dtypes.items()]
+    rows = df.astype(object).where(df.notna(), None).values.tolist()
+    return columns, rows
+
+
+def answer_payload(answer):
+    columns, rows = dataframe_payload(answer["df"])
+    return {
+        "question": answer["question"],
+        "query": answer["query"],
+        "sql": answer["sql"],
+        "columns": columns,
+        "rows": rows,
+        "row_count": len(rows),
+        "cached": answer["cached"],
+        "computed_at": answer["computed_at"],
+        "patched": answer["patched"],
+        "llm_calls": answer["llm_calls"],
+        "fewshot": answer["fewshot"],
+        "template": answer["template"],
+        "model": answer["model"],
+        "cascade": answer["cascade"],
+        "timings": answer["timings"],
+    }
+
+
+def json_response(payload, status=200):
+    resp = web.json_response(payload, status=status, dumps=_dumps)
+    resp.enable_compression()
+    return resp
+
+
+def error_response(message, status=400):
+    return json_response({"error": message}, status=status)
+
+
+# ============= EJECUCIÓN =============
+async def run_question(app, question: str, exact: bool = False):
+    """
+    Ejecuta el pipeline en el pool de hilos. Si la misma pregunta ya está en curso
+    (otra petición o el mismo batch), se espera a ese resultado en lugar de repetirla.
+    """
+    key = (normalize_question(question), exact)
+    inflight = app["inflight"]
+    if key in inflight:
+        return await asyncio.shield(inflight[key])
+
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(app["executor"], partial(_answer, question, exact))
+    inflight[key] = future
+    try:
+        answer = await asyncio.shield(future)
+    finally:
+        inflight.pop(key, None)
+
+    if answer["sql"] is not None:
+        log_question(
+            question, answer["sql"], len(answer["df"]), answer["timings"].get("total"),
+            llm_calls=answer["llm_calls"], fewshot=answer["fewshot"],
+            template=answer["template"], model=answer["model"]
+        )
+    return answer
+
+
+def _answer(question: str, exact: bool):
+    # Si el agente aún se está construyendo, esta llamada espera a que termine
+    agent, db = get_shared_agent_and_db()
+    return answer_question(agent, db, question, exact=exact)
+
+
+async def _read_json(request):
+    try:
+        return await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise web.HTTPBadRequest(text=_dumps({"error": "JSON inválido"}), content_type="application/json")
+
+
+def _question_from(body):
+    question = (body or {}).get("question") if isinstance(body, dict) else None
+    if not isinstance(question, str) or not question.strip():
+        raise web.HTTPBadRequest(text=_dumps({"error": "Falta 'question'"}), content_type="application/json")
+    return question.strip()
+
+
+# ============= ENDPOINTS =============
+async def health(request):
+    return json_response({"status": "ok"})
+
+
+async def query(request):
+    """POST /query {"question": "..."} -> SQL, columnas tipadas, filas y tiempos."""
+    question = _question_from(await _read_json(request))
+    try:
+        answer = await run_question(request.app, question)
+    except Exception as e:
+        return error_response(f"Error al procesar: {e}", status=500)
+    if answer["sql"] is None:
+        return error_response("No se pudo extraer la SQL de la respuesta del agente", status=422)
+    return json_response(answer_payload(answer))
+
+
+async def batch(request):
+    """POST /batch {"questions": [...]} -> resultados en el mismo orden, deduplicando preguntas."""
+    body = await _read_json(request)
+    questions = body.get("questions") if isinstance(body, dict) else None
+    if not isinstance(questions, list) or not all(isinstance(q, str) for q in questions):
+        return error_response("Falta 'questions' (lista de strings)")
+    if len(questions) > BATCH_MAX_QUESTIONS:
+        return error_response(f"Máximo {BATCH_MAX_QUESTIONS} preguntas por batch")
+
+    t0 = time.perf_counter()
+    unique = {}
+    for q in questions:
+        # Las vacías no se ejecutan: reciben su propio error (como en /query)
+        if q.strip():
+            unique.setdefault(normalize_question(q), q.strip())
+
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def _one(q):
+        async with semaphore:
+            try:
+                answer = await run_question(request.app, q)
+            except Exception as e:
+                return {"question": q, "error": str(e)}
+            if answer["sql"] is None:
+                return {"question": q, "error": "No se pudo extraer la SQL"}
+            return answer_payload(answer)
+
+    results = await asyncio.gather(*(_one(q) for q in unique.values()))
+    by_key = dict(zip(unique.keys(), results))
+
+    return json_response({
+        "results": [
+            by_key[normalize_question(q)] if q.strip() else {"question": q, "error": "Falta 'question'"}
+            for q in questions
+        ],
+        "unique_questions": len(unique),
+        "timings": {"total": time.perf_counter() - t0},
+    })
+
+
+async def export(request):
+    """POST /export {"question": "...", "format": "csv"|"parquet"} -> archivo en streaming."""
+    body = await _read_json(request)
+    question = _question_from(body)
+    fmt = (body.get("format") or "csv").lower()
+    if fmt not in ("csv", "parquet"):
+        return error_response("Formato no soportado (csv o parquet)")
+
+    try:
+        # Las exportaciones siempre son exactas (nunca la vista previa muestreada)
+        answer = await run_question(request.app, question, exact=True)
+    except Exception as e:
+        return error_response(f"Error al procesar: {e}", status=500)
+    if answer["sql"] is None:
+        return error_response("No se pudo extraer la SQL de la respuesta del agente", status=422)
+
+    df = answer["df"]
+    stamp = time.strftime("%Y%m%d_%H%M%S")
+    resp = web.StreamResponse(headers={
+        "Content-Disposition": f'attachment; filename="resultado_{stamp}.{fmt}"',
+    })
+
+    if fmt == "csv":
+        resp.content_type = "text/csv"
+        resp.charset = "utf-8"
+        resp.enable_compression()
+        await resp.prepare(request)
+        # Cada chunk se serializa en el pool: to_csv no bloquea el event loop (ni /health)
+        loop = asyncio.get_running_loop()
+        for start in range(0, max(len(df), 1), EXPORT_CHUNK_ROWS):
+            data = await loop.run_in_executor(request.app["executor"], _to_csv_chunk, df, start)
+            await resp.write(data)
+    else:
+        # Parquet ya va comprimido (snappy): no se vuelve a comprimir en HTTP
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(request.app["executor"], _to_parquet, df)
+        resp.content_type = "application/vnd.apache.parquet"
+        resp.content_length = len(data)
+        await resp.prepare(request)
+        view = memoryview(data)
+        for start in range(0, len(view), 1 << 20):
+            await resp.write(view[start:start + (1 << 20)])
+
+    await resp.write_eof()
+    return resp
+
+
+def saved_payload(entry, with_rows=False):
+    payload = {k: entry.get(k) for k in (
+        "id", "question", "sql", "watermark", "mode", "updated_at", "refresh_seconds", "export_path"
+    )}
+    payload["incremental"] = entry.get("plan") is not None
+    if with_rows and entry.get("df") is not None:
+        payload["columns"], payload["rows"] = dataframe_payload(entry["df"])
+    return payload
+
+
+async def saved_list(request):
+    """GET /saved -> consultas guardadas y su estado de refresco."""
+    return json_response({"saved": [saved_payload(e) for e in list_saved()]})
+
+
+async def saved_create(request):
+    """POST /saved {"question": "..."} -> resuelve la pregunta y la guarda en modo watch."""
+    question = _question_from(await _read_json(request))
+    try:
+        answer = await run_question(request.app, question, exact=True)
+        if answer["sql"] is None:
+            return error_response("No se pudo extraer la SQL de la respuesta del agente", status=422)
+        loop = asyncio.get_running_loop()
+        _, db = await loop.run_in_executor(request.app["executor"], get_shared_agent_and_db)
+        entry = await loop.run_in_executor(
+            request.app["executor"], save_query, db, answer["query"], answer["sql"]
+        )
+    except Exception as e:
+        return error_response(f"Error al procesar: {e}", status=500)
+    return json_response(saved_payload(entry, with_rows=True), status=201)
+
+
+async def saved_detail(request):
+    """GET /saved/{id} -> último resultado de la consulta guardada."""
+    entry = get_saved(request.match_info["id"])
+    if entry is None:
+        return error_response("Consulta guardada no encontrada", status=404)
+    return json_response(saved_payload(entry, with_rows=True))
+
+
+async def saved_delete(request):
+    if not remove_saved(request.match_info["id"]):
+        return error_response("Consulta guardada no encontrada", status=404)
+    return json_response({"deleted": request.match_info["id"]})
+
+
+def _to_csv_chunk(df, start: int) -> bytes:
+    chunk = df.iloc[start:start + EXPORT_CHUNK_ROWS]
+    return chunk.to_csv(index=False, header=(start == 0)).encode("utf-8")
+
+
+def _to_parquet(df) -> bytes:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    buf = io.BytesIO()
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_table(table, buf, row_group_size=EXPORT_CHUNK_ROWS)
+    return buf.getvalue()
+
+
+# ============= APP =============
+def _start_background_jobs(agent, db):
+    start_background_warmup(agent, db)
+    start_background_watch(agent, db)
+
+
+async def _on_startup(app):
+    app["executor"] = ThreadPoolExecutor(max_workers=API_WORKERS, thread_name_prefix="api")
+    app["inflight"] = {}
+    # El agente se construye en segundo plano (el servidor acepta conexiones ya);
+    # al terminar arranca el mismo precalentamiento y refresco de consultas guardadas que la UI
+    init_in_background(on_ready=_start_background_jobs)
+
+
+async def _on_cleanup(app):
+    app["executor"].shutdown(wait=False)
+
+
+def create_app() -> web.Application:
+    app = web.Application(client_max_size=1 << 20)
+    app.router.add_get("/health", health)
+    app.router.add_post("/query", query)
+    app.router.add_post("/batch", batch)
+    app.router.add_post("/export", export)
+    app.router.add_get("/saved", saved_list)
+    app.router.add_post("/saved", saved_create)
+    app.router.add_get("/saved/{id}", saved_detail)
+    app.router.add_delete("/saved/{id}", saved_delete)
+    app.on_startup.append(_on_startup)
+    app.on_cleanup.append(_on_cleanup)
+    return app
+
+
+if __name__ == "__main__":
+    web.run_app(create_app(), host=API_HOST, port=API_PORT, keepalive_timeout=API_KEEPALIVE)
@@ -0,0 +1,88 @@
+# benchmarks/bench_cascade.py
+# Cascada de modelos sin Bedrock ni BD: agentes simulados con distinta latencia y tasa de acierto.
+# Compara "solo modelo grande", "solo modelo pequeño" y la cascada pequeño -> grande.
+#
+# Uso: python -m benchmarks.bench_cascade [--rounds 5] [--small-latency 0.05] [--large-latency 0.3]
+import argparse
+import random
+import sys
+import time
+import zlib
+from types import SimpleNamespace
+
+from agent.examples import EXAMPLES
+from agent.model_cascade import MODEL_STATS, ModelCascade, model_stats_report
+
+
+class StubAgent:
+    """
+    Imita un AgentExecutor de SQL: `steps` iteraciones ReAct de `latency` segundos cada una.
+    Acierta (devuelve filas) con probabilidad `accuracy`; la dificultad de cada pregunta es
+    fija, así que un modelo más preciso acierta en un superconjunto de las preguntas.
+    """
+
+    def __init__(self, model_id, latency, accuracy, steps=3, seed=42):
+        self.model_id = model_id
+        self.latency = latency
+        self.accuracy = accuracy
+        self.steps = steps
+        self.seed = seed
+
+    def invoke(self, inputs, **kwargs):
+        question = inputs["input"]
+        difficulty = random.Random(zlib.crc32(question.encode("utf-8")) ^ self.seed).random()
+        time.sleep(self.latency * self.steps)
+        rows = "[('Bogotá', 1250000.0)]" if difficulty < self.accuracy else "[]"
+        action = SimpleNamespace(tool="sql_db_query", tool_input=f"SELECT 1 -- {self.model_id}")
+        return {"output": "ok", "intermediate_steps": [(action, rows)] * self.steps}
+
+
+def stub_validate(sql_stmt, raw_results):
+    if sql_stmt is None:
+        return False, "sin SQL"
+    return (True, "ok") if raw_results else (False, "sin filas")
+
+
+def run(name, cascade, questions):
+    MODEL_STATS.clear()
+    ok, t0 = 0, time.perf_counter()
+    for question in questions:
+        out = cascade.invoke({"input": question})
+        ok += int(out["cascade"][-1]["accepted"])
+    secs = time.perf_counter() - t0
+    n = len(questions)
+    print(f"\n{name}: {secs / n * 1000:7.1f}ms/pregunta | aceptadas {ok}/{n} ({ok / n:.0%})")
+    for model_id, (attempts, success, latency) in model_stats_report().items():
+        print(f"  {model_id:10s} intentos={attempts:4d} éxito={success:5.0%} latencia={latency * 1000:7.1f}ms")
+    return secs / n, ok / n
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cascada de modelos con agentes simulados")
+    parser.add_argument("--rounds", type=int, default=5, help="Veces que se repiten los ejemplos")
+    parser.add_argument("--small-latency", type=float, default=0.05, help="Segundos por llamada (pequeño)")
+    parser.add_argument("--large-latency", type=float, default=0.3, help="Segundos por llamada (grande)")
+    parser.add_argument("--small-accuracy", type=float, default=0.8)
+    parser.add_argument("--large-accuracy", type=float, default=0.97)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    # Variantes de cada ejemplo para que la dificultad no se repita en todas las rondas
+    questions = [f"{q} (#{r})" for r in range(args.rounds) for q in EXAMPLES]
+    small = StubAgent("pequeño", args.small_latency, args.small_accuracy, seed=args.seed)
+    large = StubAgent("grande", args.large_latency, args.large_accuracy, seed=args.seed)
+
+    base_t, base_ok = run("Solo grande", ModelCascade([("grande", large)], stub_validate), questions)
+    run("Solo pequeño", ModelCascade([("pequeño", small)], stub_validate), questions)
+    casc_t, casc_ok = run(
+        "Cascada pequeño -> grande",
+        ModelCascade([("pequeño", small), ("grande", large)], stub_validate),
+        questions,
+    )
+
+    print(f"\nCascada vs solo grande: latencia x{casc_t / base_t:.2f}, aceptadas {casc_ok:.0%} vs {base_ok:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+# benchmarks/bench_fewshot.py
+# Compara llamadas al LLM por pregunta con y sin ejemplos verificados (few-shot).
+# Cada pregunta se consulta dejando fuera su propio par del almacén (leave-one-out).
+# Uso: python -m benchmarks.bench_fewshot [log.jsonl]
+import sys
+import time
+
+from agent.example_store import ExampleStore, build_fewshot_input, llm_calls_report, load_from_history
+from agent.examples import EXAMPLES
+from agent.langchain_agent import get_agent_and_db
+from agent.sql_results import extract_sql_and_results
+
+
+def run(agent, text):
+    t0 = time.time()
+    out = agent.invoke({"input": text})
+    steps = out.get("intermediate_steps", [])
+    sql, rows = extract_sql_and_results(steps)
+    # La cascada de modelos ya cuenta las llamadas de todos los modelos que lo intentaron
+    return out.get("llm_calls", len(steps) + 1), time.time() - t0, sql is not None and bool(rows)
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else None
+    store = load_from_history(ExampleStore(), path)
+    if not len(store):
+        print("⚠️  El historial no tiene ejemplos verificados: ejecuta antes run_examples.py")
+        return 1
+
+    agent, _ = get_agent_and_db()
+    totals = {"sin": [0, 0.0, 0], "con": [0, 0.0, 0]}
+
+    print("\n=== Llamadas al LLM por pregunta: sin / con ejemplos ===\n")
+    for idx, question in enumerate(EXAMPLES, start=1):
+        examples = store.search(question, exclude_same=True)
+        base = run(agent, question)
+        shot = run(agent, build_fewshot_input(question, examples))
+        for name, (calls, secs, ok) in (("sin", base), ("con", shot)):
+            totals[name][0] += calls
+            totals[name][1] += secs
+            totals[name][2] += int(ok)
+        print(f"[{idx:02d}] llm={base[0]:2d} → {shot[0]:2d} | t={base[1]:5.1f}s → {shot[1]:5.1f}s "
+              f"| k={len(examples)} | {question[:60]}")
+
+    n = len(EXAMPLES)
+    print("\n=== Resumen ===")
+    for name in ("sin", "con"):
+        calls, secs, ok = totals[name]
+        print(f"{name} ejemplos: {calls / n:.2f} llamadas/pregunta | {secs / n:.1f}s/pregunta | OK={ok}/{n}")
+    saved = 1 - totals["con"][0] / max(totals["sin"][0], 1)
+    print(f"Reducción de llamadas al LLM: {saved:.0%}")
+
+    report = llm_calls_report(path)
+    if report:
+        print("\nHistorial (tráfico real):")
+        for name, (count, avg) in report.items():
+            print(f"  {name}: {avg:.2f} llamadas/pregunta en {count} preguntas")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
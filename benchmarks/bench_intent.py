@@ -0,0 +1,54 @@
+# benchmarks/bench_intent.py
+# Uso: python -m benchmarks.bench_intent [N] [ruta_log.jsonl]
+import random
+import sys
+import time
+
+from agent.examples import EXAMPLES
+from agent.query_parser import DEFAULT_SEDES, MONTHS, extract_intents, intent_key
+from agent.cache import read_history
+
+
+def synthetic_prompts(n: int, seed: int = 0):
+    """Genera n prompts variando ciudad, mes, año y top-N sobre plantillas reales."""
+    rng = random.Random(seed)
+    templates = [
+        "Top {k} productos más vendidos en {sede} en {mes} de {year}",
+        "Total de ventas por sede en {year}, exporta a csv",
+        "Muestra un gráfico de ventas por mes en {sede} durante {year}",
+        "Promedio de cantidad vendida en {sede} entre {year}-01-01 y {year}-06-30",
+        "Producto más vendido en {sede} en {mes}",
+    ]
+    months = list(MONTHS)
+    prompts = list(EXAMPLES)
+    while len(prompts) < n:
+        prompts.append(rng.choice(templates).format(
+            k=rng.randint(3, 20),
+            sede=rng.choice(DEFAULT_SEDES),
+            mes=rng.choice(months),
+            year=rng.choice([2024, 2025]),
+        ))
+    return prompts[:n]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    if len(sys.argv) > 2:
+        prompts = [e["query"] for e in read_history(sys.argv[2]) if e.get("query")]
+        print(f"Log: {sys.argv[2]} ({len(prompts):,} prompts)")
+    else:
+        prompts = synthetic_prompts(n)
+
+    t0 = time.perf_counter()
+    intents = extract_intents(prompts)
+    elapsed = time.perf_counter() - t0
+
+    keys = {intent_key(i) for i in intents}
+    print(f"Prompts:      {len(prompts):,}")
+    print(f"Tiempo:       {elapsed:.3f}s")
+    print(f"Throughput:   {len(prompts) / elapsed:,.0f} prompts/s")
+    print(f"Claves únicas: {len(keys):,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# benchmarks/bench_scale.py
+# Ejecuta las SQL de los ejemplos de run_examples.py sobre `ventas` a distintos tamaños.
+#
+# ⚠️ Vacía y recarga la tabla `ventas` de DB_URI: úsalo solo contra una BD de pruebas.
+# Uso: DB_URI=postgresql://... python -m benchmarks.bench_scale --sizes 1M,10M --yes
+import argparse
+import os
+import sys
+import time
+
+from agent.cache import get_cached_sql, put_cached
+from agent.examples import EXAMPLES
+from agent.langchain_agent import get_agent_and_db
+from agent.sql_results import run_sql
+from agent.warmup import resolve_question
+from db.generate_ventas import copy_to_db, generate_chunks, parse_rows, profile_csv
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de los ejemplos a escala")
+    parser.add_argument("--sizes", default="1M,10M", help="Tamaños separados por coma")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3, help="Ejecuciones por consulta (se toma la mejor)")
+    parser.add_argument("--yes", action="store_true", help="Confirma que se puede vaciar `ventas`")
+    args = parser.parse_args(argv)
+
+    if not args.yes:
+        parser.error("este benchmark vacía `ventas`; confirma con --yes")
+
+    db_uri = os.getenv("DB_URI", "postgresql://user:password@db:5432/postgres")
+    agent, db = get_agent_and_db()
+    profile = profile_csv()
+
+    # La SQL de cada pregunta se resuelve una sola vez (el LLM no escala con los datos)
+    sqls = {}
+    for question in EXAMPLES:
+        sql_stmt = get_cached_sql(question) or resolve_question(agent, question)
+        if sql_stmt:
+            put_cached(question, sql_stmt)
+            sqls[question] = sql_stmt
+
+    results = []
+    for size in [parse_rows(s) for s in args.sizes.split(",")]:
+        t0 = time.time()
+        copy_to_db(generate_chunks(profile, size, seed=args.seed), db_uri, truncate=True)
+        with db._engine.begin() as conn:
+            conn.exec_driver_sql("ANALYZE ventas")
+        load_s = time.time() - t0
+        print(f"\n=== {size:,} filas (carga {load_s:.1f}s) ===")
+
+        for idx, (question, sql_stmt) in enumerate(sqls.items(), start=1):
+            best, rows = None, 0
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                rows = len(run_sql(db, sql_stmt))
+                secs = time.perf_counter() - t0
+                best = secs if best is None else min(best, secs)
+            print(f"[{idx:02d}] filas={rows:5d} | t={best * 1000:8.1f}ms | {question[:70]}")
+            results.append((size, idx, rows, best))
+
+    print("\n=== Resumen (ms por tamaño) ===")
+    sizes = sorted({r[0] for r in results})
+    print("ej  " + "".join(f"{s:>12,}" for s in sizes))
+    for idx in range(1, len(sqls) + 1):
+        cells = {r[0]: r[3] for r in results if r[1] == idx}
+        print(f"{idx:02d}  " + "".join(f"{cells[s] * 1000:12.1f}" for s in sizes))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
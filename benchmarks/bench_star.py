@@ -0,0 +1,168 @@
+# benchmarks/bench_star.py
+# Compara el layout plano de `ventas` con el esquema estrella opcional de db/init.sql:
+# tamaño en disco y tiempo de scan / GROUP BY con la misma SQL (a través de la vista `ventas`).
+#
+# Crea (y borra al terminar, salvo --keep) los esquemas bench_plano y bench_estrella en DB_URI
+# y los procedimientos del esquema estrella en public si no estaban instalados.
+# Uso: DB_URI=postgresql://... python -m benchmarks.bench_star --rows 10M --yes
+import argparse
+import os
+import re
+import sys
+import time
+from contextlib import closing
+from urllib.parse import quote
+
+from db.generate_ventas import copy_to_db, generate_chunks, parse_rows, profile_csv
+
+INIT_SQL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "db", "init.sql")
+SCHEMAS = ("bench_plano", "bench_estrella")
+# Rutinas que la sección del esquema estrella crea en public (se borran al terminar si no existían)
+STAR_ROUTINES = (
+    ("PROCEDURE", "cargar_ventas_estrella(regclass)"),
+    ("PROCEDURE", "usar_esquema_estrella()"),
+    ("FUNCTION", "ventas_insertar_estrella()"),
+)
+
+# Misma SQL en los dos layouts (en el estrella pasa por la vista de compatibilidad)
+QUERIES = {
+    "scan_monto": "SELECT SUM(cantidad*precio) FROM ventas",
+    "sede": "SELECT sede, SUM(cantidad*precio) AS total FROM ventas GROUP BY sede ORDER BY total DESC",
+    "producto_2025": (
+        "SELECT producto, SUM(cantidad) FROM ventas "
+        "WHERE fecha >= '2025-01-01' AND fecha < '2026-01-01' GROUP BY producto"
+    ),
+    "vendedor_mes": "SELECT vendedor, date_trunc('month', fecha) AS mes, COUNT(*) FROM ventas GROUP BY 1, 2",
+}
+# Solo en el esquema estrella: usando la columna precalculada
+STAR_QUERIES = {
+    "sede_monto": "SELECT sede, SUM(monto) AS total FROM ventas GROUP BY sede ORDER BY total DESC",
+}
+
+
+def _init_sql_parts():
+    """(DDL de la tabla plana, sección del esquema estrella) leídos de db/init.sql."""
+    with open(INIT_SQL, encoding="utf-8") as fh:
+        sql = fh.read()
+    flat = re.search(r"CREATE TABLE ventas \(.*?\);", sql, re.DOTALL).group(0)
+    star = sql[sql.index("-- ============= ESQUEMA ESTRELLA"):]
+    return flat, star
+
+
+def _with_search_path(db_uri: str, schema: str) -> str:
+    sep = "&" if "?" in db_uri else "?"
+    return f"{db_uri}{sep}options={quote(f'-csearch_path={schema},public')}"
+
+
+def _connect(db_uri, schema=None):
+    import psycopg2
+
+    conn = psycopg2.connect(_with_search_path(db_uri, schema) if schema else db_uri)
+    conn.autocommit = True
+    return conn
+
+
+def _size(cur, tables):
+    cur.execute(
+        "SELECT COALESCE(SUM(pg_total_relation_size(to_regclass(t))), 0) FROM unnest(%s::text[]) t",
+        (list(tables),)
+    )
+    return int(cur.fetchone()[0])
+
+
+def _best_time(cur, sql, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        cur.execute(sql)
+        cur.fetchall()
+        secs = time.perf_counter() - t0
+        best = secs if best is None else min(best, secs)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Layout plano vs esquema estrella de ventas")
+    parser.add_argument("--rows", default="10M", help="Filas a generar (10M, 50M...)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3, help="Ejecuciones por consulta (se toma la mejor)")
+    parser.add_argument("--keep", action="store_true", help="No borra los esquemas de prueba al terminar")
+    parser.add_argument("--yes", action="store_true", help="Confirma que se pueden crear/borrar bench_*")
+    args = parser.parse_args(argv)
+
+    if not args.yes:
+        parser.error(f"este benchmark crea y borra los esquemas {', '.join(SCHEMAS)}; confirma con --yes")
+
+    db_uri = os.getenv("DB_URI", "postgresql://user:password@db:5432/postgres")
+    rows = parse_rows(args.rows)
+    flat_ddl, star_sql = _init_sql_parts()
+
+    admin = _connect(db_uri)
+    with admin.cursor() as cur:
+        # Procedimientos del esquema estrella (CREATE OR REPLACE: idempotente). Se anotan
+        # los que ya existían para no borrarlos al terminar
+        cur.execute("SELECT to_regprocedure(s) IS NULL FROM unnest(%s::text[]) s",
+                    ([sig for _, sig in STAR_ROUTINES],))
+        installed = [r for r, (missing,) in zip(STAR_ROUTINES, cur.fetchall()) if missing]
+        cur.execute(star_sql)
+        for schema in SCHEMAS:
+            cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+            cur.execute(f"CREATE SCHEMA {schema}")
+
+    try:
+        # 1) Layout plano: tabla de init.sql + carga con COPY
+        t0 = time.time()
+        with closing(_connect(db_uri, "bench_plano")) as conn, conn.cursor() as cur:
+            cur.execute(flat_ddl)
+        copy_to_db(generate_chunks(profile_csv(), rows, seed=args.seed),
+                   _with_search_path(db_uri, "bench_plano"))
+        print(f"plano: {rows:,} filas cargadas en {time.time() - t0:.1f}s")
+
+        # 2) Esquema estrella: mismas filas + migración de init.sql
+        t0 = time.time()
+        with closing(_connect(db_uri, "bench_estrella")) as conn, conn.cursor() as cur:
+            cur.execute(flat_ddl)
+            cur.execute("INSERT INTO ventas SELECT * FROM bench_plano.ventas")
+            cur.execute("CALL usar_esquema_estrella()")
+        print(f"estrella: migración en {time.time() - t0:.1f}s")
+
+        layouts = {
+            "bench_plano": ["bench_plano.ventas"],
+            "bench_estrella": [f"bench_estrella.{t}" for t in
+                               ("ventas_hechos", "dim_sede", "dim_producto", "dim_vendedor")],
+        }
+        results = {}
+        for schema, tables in layouts.items():
+            with closing(_connect(db_uri, schema)) as conn, conn.cursor() as cur:
+                for table in tables:
+                    cur.execute(f"VACUUM ANALYZE {table}")
+                size = _size(cur, tables)
+                queries = dict(QUERIES, **(STAR_QUERIES if schema == "bench_estrella" else {}))
+                results[schema] = {"size": size}
+                for name, sql in queries.items():
+                    results[schema][name] = _best_time(cur, sql, args.repeat)
+    finally:
+        if not args.keep:
+            with admin.cursor() as cur:
+                for schema in SCHEMAS:
+                    cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+                # Con --keep se conservan: el trigger de bench_estrella.ventas los usa
+                for kind, sig in installed:
+                    cur.execute(f"DROP {kind} IF EXISTS public.{sig}")
+        admin.close()
+
+    plano, estrella = results["bench_plano"], results["bench_estrella"]
+    print(f"\n=== {rows:,} filas ===\n")
+    print(f"{'':18s}{'plano':>14s}{'estrella':>14s}{'ratio':>9s}")
+    print(f"{'tamaño (MB)':18s}{plano['size'] / 2**20:14.1f}{estrella['size'] / 2**20:14.1f}"
+          f"{estrella['size'] / max(plano['size'], 1):9.2f}")
+    for name in list(QUERIES) + list(STAR_QUERIES):
+        p, e = plano.get(name), estrella.get(name)
+        p_txt = f"{p * 1000:12.1f}ms" if p is not None else f"{'-':>14s}"
+        ratio = f"{e / p:9.2f}" if p else f"{'-':>9s}"
+        print(f"{name:18s}{p_txt}{e * 1000:12.1f}ms{ratio}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,4 +11,153 @@ CREATE TABLE ventas (
 COPY ventas(id, vendedor, sede, producto, cantidad, precio, fecha)
 FROM '/docker-entrypoint-initdb.d/ventas.csv'
 DELIMITER ','
-CSV HEADER;
\ No newline at end of file
+CSV HEADER;
+
+-- ============= ESQUEMA ESTRELLA (OPCIONAL) =============
+-- Las cadenas repetidas (vendedor, sede, producto) pasan a dimensiones con claves
+-- enteras y la tabla de hechos usa solo tipos de ancho fijo, con `monto` precalculado.
+-- `ventas` queda como vista con las mismas columnas (más `monto`), así que la SQL
+-- del agente sigue funcionando. No se aplica por defecto:
+--
+--   CALL usar_esquema_estrella();
+--
+-- Los precios se guardan en pesos enteros (la migración falla si hay decimales).
+
+-- Inserta en dimensiones + hechos las filas de una tabla con las columnas de `ventas`
+CREATE OR REPLACE PROCEDURE cargar_ventas_estrella(origen regclass)
+LANGUAGE plpgsql AS $$
+BEGIN
+  -- Solo los valores nuevos: ON CONFLICT DO NOTHING gastaría un valor de la identidad por fila
+  EXECUTE format(
+    'INSERT INTO dim_sede (sede) SELECT DISTINCT o.sede FROM %s o WHERE o.sede IS NOT NULL '
+    'AND NOT EXISTS (SELECT 1 FROM dim_sede d WHERE d.sede = o.sede) '
+    'ON CONFLICT (sede) DO NOTHING', origen);
+  EXECUTE format(
+    'INSERT INTO dim_producto (producto) SELECT DISTINCT o.producto FROM %s o WHERE o.producto IS NOT NULL '
+    'AND NOT EXISTS (SELECT 1 FROM dim_producto d WHERE d.producto = o.producto) '
+    'ON CONFLICT (producto) DO NOTHING', origen);
+  EXECUTE format(
+    'INSERT INTO dim_vendedor (vendedor) SELECT DISTINCT o.vendedor FROM %s o WHERE o.vendedor IS NOT NULL '
+    'AND NOT EXISTS (SELECT 1 FROM dim_vendedor d WHERE d.vendedor = o.vendedor) '
+    'ON CONFLICT (vendedor) DO NOTHING', origen);
+
+  EXECUTE format(
+    'INSERT INTO ventas_hechos (id, fecha, precio, cantidad, vendedor_id, sede_id, producto_id) '
+    'SELECT o.id, o.fecha, o.precio::integer, o.cantidad, dv.vendedor_id, ds.sede_id, dp.producto_id '
+    'FROM %s o '
+    'LEFT JOIN dim_vendedor dv ON dv.vendedor = o.vendedor '
+    'LEFT JOIN dim_sede ds ON ds.sede = o.sede '
+    'LEFT JOIN dim_producto dp ON dp.producto = o.producto', origen);
+
+  PERFORM setval(pg_get_serial_sequence('ventas_hechos', 'id'),
+                 (SELECT COALESCE(MAX(id), 1) FROM ventas_hechos));
+END $$;
+
+-- INSERT sobre la vista `ventas` (fila a fila; para cargas masivas usar cargar_ventas_estrella)
+CREATE OR REPLACE FUNCTION ventas_insertar_estrella() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+  v_id INTEGER;
+  s_id SMALLINT;
+  p_id SMALLINT;
+BEGIN
+  -- Se busca la clave antes de insertar: INSERT ... ON CONFLICT DO NOTHING consume un valor
+  -- de la identidad aunque no inserte, y las claves SMALLINT se agotarían tras ~32k filas
+  IF NEW.vendedor IS NOT NULL THEN
+    LOOP
+      SELECT vendedor_id INTO v_id FROM dim_vendedor WHERE vendedor = NEW.vendedor;
+      EXIT WHEN FOUND;
+      BEGIN
+        INSERT INTO dim_vendedor (vendedor) VALUES (NEW.vendedor) RETURNING vendedor_id INTO v_id;
+        EXIT;
+      EXCEPTION WHEN unique_violation THEN
+        NULL;  -- otra sesión la insertó a la vez: se vuelve a leer
+      END;
+    END LOOP;
+  END IF;
+  IF NEW.sede IS NOT NULL THEN
+    LOOP
+      SELECT sede_id INTO s_id FROM dim_sede WHERE sede = NEW.sede;
+      EXIT WHEN FOUND;
+      BEGIN
+        INSERT INTO dim_sede (sede) VALUES (NEW.sede) RETURNING sede_id INTO s_id;
+        EXIT;
+      EXCEPTION WHEN unique_violation THEN
+        NULL;  -- otra sesión la insertó a la vez: se vuelve a leer
+      END;
+    END LOOP;
+  END IF;
+  IF NEW.producto IS NOT NULL THEN
+    LOOP
+      SELECT producto_id INTO p_id FROM dim_producto WHERE producto = NEW.producto;
+      EXIT WHEN FOUND;
+      BEGIN
+        INSERT INTO dim_producto (producto) VALUES (NEW.producto) RETURNING producto_id INTO p_id;
+        EXIT;
+      EXCEPTION WHEN unique_violation THEN
+        NULL;  -- otra sesión la insertó a la vez: se vuelve a leer
+      END;
+    END LOOP;
+  END IF;
+
+  NEW.id := COALESCE(NEW.id, nextval(pg_get_serial_sequence('ventas_hechos', 'id')));
+  INSERT INTO ventas_hechos (id, fecha, precio, cantidad, vendedor_id, sede_id, producto_id)
+  VALUES (NEW.id, NEW.fecha, NEW.precio::integer, NEW.cantidad, v_id, s_id, p_id);
+  NEW.monto := NEW.cantidad::bigint * NEW.precio::integer;
+  RETURN NEW;
+END $$;
+
+CREATE OR REPLACE PROCEDURE usar_esquema_estrella()
+LANGUAGE plpgsql AS $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM ventas WHERE precio <> trunc(precio)) THEN
+    RAISE EXCEPTION 'ventas.precio tiene decimales: el esquema estrella guarda pesos enteros';
+  END IF;
+
+  CREATE TABLE dim_sede (
+    sede_id SMALLINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    sede VARCHAR(50) NOT NULL UNIQUE
+  );
+  CREATE TABLE dim_producto (
+    producto_id SMALLINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    producto VARCHAR(100) NOT NULL UNIQUE
+  );
+  CREATE TABLE dim_vendedor (
+    vendedor_id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    vendedor VARCHAR(50) NOT NULL UNIQUE
+  );
+
+  -- Columnas de 8 bytes primero y luego las de 4 y 2: sin relleno por alineación
+  CREATE TABLE ventas_hechos (
+    monto BIGINT GENERATED ALWAYS AS (cantidad::bigint * precio) STORED,
+    id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    fecha DATE,
+    precio INTEGER,
+    cantidad INTEGER,
+    vendedor_id INTEGER REFERENCES dim_vendedor (vendedor_id),
+    sede_id SMALLINT REFERENCES dim_sede (sede_id),
+    producto_id SMALLINT REFERENCES dim_producto (producto_id)
+  );
+
+  ALTER TABLE ventas RENAME TO ventas_plana;
+  CALL cargar_ventas_estrella('ventas_plana');
+  DROP TABLE ventas_plana;
+
+  -- LEFT JOIN sobre claves únicas: si la consulta no usa la dimensión, el planner quita el join.
+  -- precio vuelve a NUMERIC: la SQL del agente ve los mismos tipos que con la tabla plana
+  -- (si no, SUM(cantidad*precio)/SUM(cantidad) pasaría a ser división entera)
+  CREATE VIEW ventas AS
+  SELECT h.id, dv.vendedor, ds.sede, dp.producto, h.cantidad, h.precio::numeric AS precio, h.fecha, h.monto
+  FROM ventas_hechos h
+  LEFT JOIN dim_vendedor dv ON dv.vendedor_id = h.vendedor_id
+  LEFT JOIN dim_sede ds ON ds.sede_id = h.sede_id
+  LEFT JOIN dim_producto dp ON dp.producto_id = h.producto_id;
+
+  CREATE TRIGGER ventas_insertar INSTEAD OF INSERT ON ventas
+  FOR EACH ROW EXECUTE FUNCTION ventas_insertar_estrella();
+
+  ANALYZE dim_sede;
+  ANALYZE dim_producto;
+  ANALYZE dim_vendedor;
+  ANALYZE ventas_hechos;
+END $$;
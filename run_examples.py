@@ -9,6 +9,8 @@ import decimal
 import pandas as pd
 
 from agent.langchain_agent import get_agent_and_db  # usa el mismo agente de tu app
+from agent.examples import EXAMPLES  # los mismos ejemplos que la barra lateral y el warm-up
+from agent.cache import log_question  # los OK alimentan el almacén de ejemplos verificados
 
 # -------- Helpers para sacar SQL + resultados del agente --------
 def extract_sql_and_results(steps):
@@ -125,31 +127,6 @@ def rows_to_df(sql_query, rows):
     return df
 
 
-# -------- Tus ejemplos explícitos --------
-EXAMPLES = [
-    # Ventas por sede (monto)
-    "Total de ventas (cantidad*precio) por sede en 2025 — todas las sedes, sin límite, ordenar de mayor a menor.",
-    # Top N productos en una ciudad y año
-    "Top 5 productos más vendidos en Medellín en 2025 — sumar cantidad, ordenar de mayor a menor.",
-    # Producto más vendido en un mes/año concreto
-    "Producto más vendido en Bogotá en septiembre de 2024 — sumar cantidad, devolver solo 1 fila (el máximo).",
-    # Ventas por mes (monto) de un año
-    "Ventas totales por mes en 2024 — sumar cantidad*precio por mes, todas las filas (sin límite), ordenar por mes ascendente.",
-    # Ventas por producto en una ciudad
-    "Total de ventas (cantidad*precio) por producto en Cali durante 2025 — sin límite, ordenar de mayor a menor.",
-    # Sede ganadora (1 fila)
-    "Sede con mayores ventas en 2025 — sumar cantidad*precio y devolver solo la sede ganadora (1 fila).",
-    # Top productos a nivel nacional
-    "Top 10 productos con mayor cantidad vendida en todo 2025 (todas las sedes) — sumar cantidad, ordenar de mayor a menor.",
-    # Ventas diarias en un rango concreto
-    "Ventas totales por día en Bogotá entre 2025-11-01 y 2025-11-30 — sumar cantidad*precio, sin límite, ordenar por fecha ascendente.",
-    # Ranking de vendedores por monto
-    "Top 5 vendedores por ventas totales (cantidad*precio) en 2025 — ordenar de mayor a menor.",
-    # Conteo de registros por sede (útil para debug)
-    "Número de registros por sede en 2025 — sin límite, ordenar alfabéticamente por sede.",
-]
-
-
 # -------- Runner --------
 def main():
     agent, db = get_agent_and_db()
@@ -186,6 +163,10 @@ def main():
             else:
                 fail += 1
 
+            if status == "OK":
+                log_question(question, sql, row_count, elapsed,
+                             llm_calls=out.get("llm_calls", len(steps) + 1), fewshot=0)
+
             print(f"   🧠 SQL: {sql}")
             print(f"   📋 Filas: {row_count} | ⏱ {elapsed:.2f}s | ✅ {status}\n")
 
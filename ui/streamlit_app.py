@@ -1,16 +1,18 @@
 import streamlit as st
-import pandas as pd
-import ast
-import altair as alt
 import time
-import re
-import datetime
-import decimal
-from sqlalchemy import text  # ⬅️ para ejecutar SQL directo en fallbacks
+import hashlib
 
-from agent.langchain_agent import get_agent_and_db
-from agent.query_parser import detect_output_type
-from agent.actions import plot_results, save_to_csv, save_to_excel
+# pandas se importa dentro de las funciones que lo usan: la página se pinta sin cargarlo
+
+from agent.langchain_agent import INIT_STATE, INIT_TIMINGS, get_shared_agent_and_db, init_in_background
+from agent.actions import save_to_csv
+from agent.cache import answer_age, format_age, log_question
+from agent.examples import EXAMPLES
+from agent.model_cascade import model_stats_report
+from agent.pipeline import answer_question
+from agent.saved_queries import WATCH_INTERVAL, list_saved, remove_saved, save_query, start_background_watch
+from agent.sql_results import normalize_cell as _normalize_cell
+from agent.warmup import start_background_warmup
 
 st.set_page_config(
     page_title="Agente Inteligente de Ventas",
@@ -29,217 +31,73 @@ if "last_query" not in st.session_state:
     st.session_state.last_query = None
 if "last_time" not in st.session_state:
     st.session_state.last_time = None
-
-# ============= UTILIDADES FECHAS (REGLA DURA + FALLBACK) =============
-SPANISH_MONTHS = {
-    "enero": 1, "febrero": 2, "marzo": 3, "abril": 4, "mayo": 5, "junio": 6,
-    "julio": 7, "agosto": 8, "septiembre": 9, "setiembre": 9, "octubre": 10,
-    "noviembre": 11, "diciembre": 12
-}
-
-# Detecta BETWEEN 'YYYY-MM-DD' AND 'YYYY-MM-DD'
-BETWEEN_RE = re.compile(
-    r"fecha\s+BETWEEN\s+'(\d{4})-(\d{2})-(\d{2})'\s+AND\s+'(\d{4})-(\d{2})-(\d{2})'",
-    re.IGNORECASE
-)
-
-def get_date_bounds_and_years(db):
-    """Devuelve (min_fecha, max_fecha, [years disponibles])."""
-    with db._engine.connect() as conn:
-        bounds = conn.execute(text(
-            "SELECT MIN(fecha) AS minf, MAX(fecha) AS maxf FROM ventas"
-        )).mappings().first()
-        years = conn.execute(text(
-            "SELECT DISTINCT EXTRACT(YEAR FROM fecha)::int AS y "
-            "FROM ventas ORDER BY y"
-        )).fetchall()
-    minf, maxf = bounds["minf"], bounds["maxf"]
-    year_list = [r[0] for r in years]
-    return minf, maxf, year_list
-
-def infer_missing_year_from_query(nl_query: str, db):
-    """
-    Si el usuario menciona un mes en español y NO menciona año (20xx),
-    añadimos por defecto el año MÁS RECIENTE con datos en la BD.
-    """
-    q = (nl_query or "").lower()
-    has_year = re.search(r"\b20\d{2}\b", q) is not None
-    month = next((m for m in SPANISH_MONTHS if m in q), None)
-    if has_year or month is None:
-        return nl_query  # no tocamos
-
-    _, _, years = get_date_bounds_and_years(db)
-    if not years:
-        return nl_query
-    last_year = years[-1]
-    return f"{nl_query.strip()} de {last_year}"
-
-def patch_sql_to_latest_year_if_out_of_range(sql_stmt: str, db):
-    """
-    Si el agente generó un BETWEEN fuera del rango de la BD (p.ej. 2023),
-    sustituimos el año por el último año disponible, manteniendo mes/día.
-    """
-    if not sql_stmt:
-        return sql_stmt
-    m = BETWEEN_RE.search(sql_stmt)
-    if not m:
-        return sql_stmt
-
-    y1, m1, d1, y2, m2, d2 = map(int, m.groups())
-    minf, maxf, years = get_date_bounds_and_years(db)
-    if not years:
-        return sql_stmt
-
-    # Si cualquiera de los años está antes del mínimo, subimos al último año con datos
-    if y1 < minf.year or y2 < minf.year:
-        target_year = years[-1]
-        new1 = f"{target_year}-{m1:02d}-{d1:02d}"
-        new2 = f"{target_year}-{m2:02d}-{d2:02d}"
-        return BETWEEN_RE.sub(
-            f"fecha BETWEEN '{new1}' AND '{new2}'",
-            sql_stmt
-        )
-
-    # También podríamos recortar si excede el máximo, pero no es necesario ahora.
-    return sql_stmt
-
-# ============= FUNCIONES AUXILIARES (EXTRACCIÓN Y DF) =============
-def extract_sql_and_results(steps):
-    """Extrae SQL y resultados tolerando reprs con datetime/Decimal."""
-    sql_query, raw_results = None, None
-
-    for action, response in reversed(steps or []):
-        if hasattr(action, "tool") and action.tool == "sql_db_query":
-            sql_query = action.tool_input
-
-            # 1) Si ya es lista/tuplas
-            if isinstance(response, list):
-                raw_results = response
-                break
-
-            # 2) Si es string, intentamos varias rutas
-            if isinstance(response, str):
-                # a) literal_eval directo
-                try:
-                    raw_results = ast.literal_eval(response)
-                    break
-                except Exception:
-                    pass
-                # b) aislar bloque [...] y literal_eval
-                try:
-                    m = re.search(r"\[.*\]", response, re.DOTALL)
-                    if m:
-                        raw_results = ast.literal_eval(m.group(0))
-                        break
-                except Exception:
-                    pass
-                # c) eval "seguro" con globals limitados
-                try:
-                    safe_globals = {
-                        "__builtins__": {},
-                        "datetime": datetime,
-                        "Decimal": decimal.Decimal,
-                    }
-                    raw_results = eval(response, safe_globals, {})
-                    if isinstance(raw_results, (list, tuple)):
-                        raw_results = list(raw_results)
-                        break
-                except Exception:
-                    pass
-
-            # 3) último recurso
-            try:
-                raw_results = list(response)
-                break
-            except Exception:
-                raw_results = None
-            break
-
-    return sql_query, raw_results
-
-def _normalize_cell(v):
-    if isinstance(v, decimal.Decimal):
-        return float(v)
-    if isinstance(v, (datetime.datetime, datetime.date)):
-        try:
-            return v.date() if hasattr(v, "date") else v
-        except Exception:
-            return str(v)
-    return v
-
-def results_to_dataframe(sql_query, raw_results):
-    """Convierte resultados a DataFrame con nombres de columnas correctos."""
-    if not raw_results:
-        return pd.DataFrame()
-
-    try:
-        select_section = sql_query.upper().split("SELECT")[1].split("FROM")[0]
-        columns = []
-        for col in select_section.split(","):
-            col = col.strip()
-            if " AS " in col.upper():
-                columns.append(col.split(" AS ")[-1].strip())
-            else:
-                columns.append(col.split(".")[-1].strip())
-
-        df = pd.DataFrame.from_records(raw_results, columns=columns)
-        df = df.applymap(_normalize_cell)
-        df.columns = [col.replace('"', '').replace('`', '').strip().upper() for col in df.columns]
-        return df
-    except Exception:
-        if raw_results and len(raw_results) > 0:
-            num_cols = len(raw_results[0]) if isinstance(raw_results[0], (list, tuple)) else 1
-            columns = [f"COLUMNA_{i+1}" for i in range(num_cols)]
-            return pd.DataFrame(raw_results, columns=columns)
-        return pd.DataFrame()
+if "last_computed_at" not in st.session_state:
+    st.session_state.last_computed_at = None
+if "last_df_key" not in st.session_state:
+    st.session_state.last_df_key = None
+
+# El agente y la conexión se construyen una vez por proceso y en segundo plano:
+# la página se pinta ya y solo se espera al agente cuando hace falta. Los trabajos en
+# segundo plano arrancan en cuanto el agente queda construido (en el hilo o en una consulta).
+def start_background_jobs(agent, db):
+    # 🔥 Precalienta SQL + resultados de los ejemplos y del top del historial
+    start_background_warmup(agent, db)
+    # 📌 Mantiene al día las consultas guardadas
+    start_background_watch(agent, db)
+
+if INIT_STATE["status"] == "idle":
+    init_in_background(on_ready=start_background_jobs)
 
 # ============= SIDEBAR =============
 with st.sidebar:
     st.header("⚙️ Configuración")
-    with st.spinner("Inicializando agente..."):
-        agent, db = get_agent_and_db()
-    st.success("✅ Agente listo")
+    if INIT_STATE["status"] == "running":
+        st.info("⏳ Inicializando agente en segundo plano...")
+    elif INIT_STATE["status"] == "error":
+        st.error(f"❌ No se pudo inicializar el agente: {INIT_STATE['error']}")
+        if st.button("🔄 Reintentar"):
+            init_in_background(on_ready=start_background_jobs)
+            st.rerun()
+    else:
+        st.success("✅ Agente listo")
+        if INIT_STATE["error"] is not None:
+            st.warning(f"⚠️ Trabajos en segundo plano sin arrancar: {INIT_STATE['error']}")
+        if INIT_TIMINGS:
+            st.caption("Init: " + ", ".join(f"{k} {v:.2f}s" for k, v in INIT_TIMINGS.items()))
+        for model_id, (attempts, success, latency) in model_stats_report().items():
+            st.caption(f"🤖 {model_id}: {success:.0%} aceptadas de {attempts}, {latency:.1f}s de media")
 
     st.divider()
 
     # Ejemplos de consultas
     st.subheader("📝 Ejemplos de consultas")
-    ejemplos = [
-        # Ventas por sede (monto)
-        "Total de ventas (cantidad*precio) por sede en 2025 — todas las sedes, sin límite, ordenar de mayor a menor.",
-        
-        # Top N productos en una ciudad y año
-        "Top 5 productos más vendidos en Medellín en 2025 — sumar cantidad, ordenar de mayor a menor.",
-        
-        # Producto más vendido en un mes/año concreto
-        "Producto más vendido en Bogotá en septiembre de 2024 — sumar cantidad, devolver solo 1 fila (el máximo).",
-                
-        # Ventas por producto en una ciudad
-        "Total de ventas (cantidad*precio) por producto en Cali durante 2025 — sin límite, ordenar de mayor a menor.",
-        
-        # Sede ganadora (1 fila)
-        "Sede con mayores ventas en 2025 — sumar cantidad*precio y devolver solo la sede ganadora (1 fila).",
-        
-        # Top productos a nivel nacional
-        "Top 10 productos con mayor cantidad vendida en todo 2025 (todas las sedes) — sumar cantidad, ordenar de mayor a menor.",
-        
-        # Ventas diarias en un rango concreto
-        "Ventas totales por día en Bogotá entre 2025-11-01 y 2025-11-30 — sumar cantidad*precio, sin límite, ordenar por fecha ascendente.",
-        
-        # Ranking de vendedores por monto
-        "Top 5 vendedores por ventas totales (cantidad*precio) en 2025 — ordenar de mayor a menor.",
-        
-        # Conteo de registros por sede (útil para debug)
-        "Número de registros por sede en 2025 — sin límite, ordenar alfabéticamente por sede."
-    ]
+    ejemplos = EXAMPLES
 
     ejemplo_seleccionado = st.selectbox("Selecciona un ejemplo:", [""] + ejemplos)
+    if ejemplo_seleccionado:
+        st.caption(f"⚡ Respuesta precalculada: {format_age(answer_age(ejemplo_seleccionado))}")
+
+    with st.expander("⚡ Frescura de respuestas precalculadas"):
+        for ej in ejemplos:
+            st.caption(f"{format_age(answer_age(ej))} — {ej[:60]}...")
+
+    st.divider()
+
+    approx_preview = st.toggle(
+        "⚡ Vista previa aproximada",
+        value=True,
+        help="En tablas grandes muestra primero un resultado estimado sobre una muestra y luego el exacto"
+    )
 
     st.divider()
 
     # Información de la BD
     if st.checkbox("🗄️ Ver información de la BD"):
         try:
+            with st.spinner("Conectando..."):
+                _, db = get_shared_agent_and_db()
+            import pandas as pd
+
             with db._engine.connect() as conn:
                 count_df = pd.read_sql("SELECT COUNT(*) as total FROM ventas", conn)
                 st.metric("Total de registros", f"{count_df['total'].iloc[0]:,}")
@@ -259,6 +117,245 @@ with st.sidebar:
         except Exception as e:
             st.error(f"Error: {e}")
 
+# ============= ARTEFACTOS DERIVADOS (MEMOIZADOS POR HASH DEL RESULTADO) =============
+# Cada artefacto se calcula una sola vez por resultado y solo cuando su vista/botón se usa.
+# Los argumentos con "_" no se hashean: la clave es `key` (hash del resultado).
+COLOR_PALETTE = [
+    "#4E79A7", "#F28E2B", "#E15759", "#76B7B2", "#59A14F",
+    "#EDC948", "#B07AA1", "#FF9DA7", "#9C755F", "#BAB0AC",
+]
+
+def result_key(df: "pd.DataFrame") -> str:
+    """Hash estable del contenido (columnas + valores) de un resultado."""
+    import pandas as pd
+
+    h = hashlib.sha1("|".join(map(str, df.columns)).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def summary_metrics(key: str, _df: "pd.DataFrame") -> dict:
+    return {"total": float(_df.select_dtypes(include=['number']).sum().sum())}
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def csv_bytes(key: str, _df: "pd.DataFrame") -> bytes:
+    return _df.to_csv(index=False).encode("utf-8")
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def stats_artifacts(key: str, _df: "pd.DataFrame"):
+    """describe() traducido + min/max/media por columna, en una sola pasada."""
+    numeric_df = _df.select_dtypes(include=['number'])
+    if numeric_df.empty:
+        return None, {}
+    # 👉 describe() con índices traducidos al español
+    stats_df = numeric_df.describe().rename(index={
+        "count": "conteo",
+        "mean": "media",
+        "std": "desviación estándar",
+        "min": "mínimo",
+        "25%": "25 %",
+        "50%": "mediana",
+        "75%": "75 %",
+        "max": "máximo"
+    })
+    # min/max/media ya están en describe(): no se recorren las columnas otra vez
+    quick = {
+        col: (stats_df.at["mínimo", col], stats_df.at["máximo", col], stats_df.at["media", col])
+        for col in stats_df.columns
+    }
+    return stats_df, quick
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def chart_frame(key: str, _df: "pd.DataFrame"):
+    """Copia normalizada para graficar + columnas numéricas/categóricas."""
+    import pandas as pd
+
+    # 👇 Copia y normaliza otra vez por si llegó algo raro
+    df_viz = _df.copy().applymap(_normalize_cell)
+
+    # Si alguna numérica quedó como object, fuerzala a numérica
+    for c in df_viz.columns:
+        if df_viz[c].dtype == "object":
+            try:
+                df_viz[c] = pd.to_numeric(df_viz[c])
+            except Exception:
+                pass
+    numeric_cols = df_viz.select_dtypes(include=['number']).columns.tolist()
+    categorical_cols = df_viz.select_dtypes(exclude=['number']).columns.tolist()
+    return df_viz, numeric_cols, categorical_cols
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def chart_spec(key: str, x_col: str, y_col: str, chart_type: str, max_items: int, _df_viz: "pd.DataFrame"):
+    """Gráfico Altair para una combinación de controles (solo se construye si cambian)."""
+    import altair as alt
+
+    df_plot = _df_viz.nlargest(max_items, y_col)
+    title = lambda c: c.replace('_', ' ').title()
+    tooltip = [alt.Tooltip(x_col, title=title(x_col)),
+               alt.Tooltip(y_col, title=title(y_col), format=',.0f')]
+    color = alt.Color(
+        x_col,
+        scale=alt.Scale(
+            domain=df_plot[x_col].tolist(),
+            range=COLOR_PALETTE[:len(df_plot)]
+        ),
+        legend=None
+    )
+
+    if chart_type == "Barras":
+        chart = alt.Chart(df_plot).mark_bar().encode(
+            x=alt.X(y_col, title=title(y_col)),
+            y=alt.Y(x_col, sort='-x', title=title(x_col)),
+            color=color,
+            tooltip=tooltip
+        )
+    elif chart_type == "Línea":
+        chart = alt.Chart(df_plot).mark_line(
+            point=alt.OverlayMarkDef(color="red", size=100)
+        ).encode(
+            x=alt.X(x_col, title=title(x_col)),
+            y=alt.Y(y_col, title=title(y_col)),
+            tooltip=tooltip
+        )
+    else:  # Puntos
+        chart = alt.Chart(df_plot).mark_circle(size=200).encode(
+            x=alt.X(x_col, title=title(x_col)),
+            y=alt.Y(y_col, title=title(y_col)),
+            color=color,
+            size=alt.Size(y_col, legend=None),
+            tooltip=tooltip
+        )
+
+    return chart.properties(
+        height=450,
+        title={
+            "text": f"{title(y_col)} por {title(x_col)}",
+            "fontSize": 16,
+            "anchor": "middle"
+        }
+    ).interactive().configure_axis(
+        labelFontSize=12,
+        titleFontSize=14
+    )
+
+# ============= VISTAS (FRAGMENTOS: SOLO SE RE-EJECUTA LA VISTA QUE CAMBIA) =============
+def render_chart(key, df):
+    if len(df.columns) < 2:
+        st.info("📊 Se necesitan al menos 2 columnas para crear un gráfico")
+        return
+
+    df_viz, numeric_cols, categorical_cols = chart_frame(key, df)
+    if not (numeric_cols and categorical_cols):
+        st.info("📊 Se necesita al menos una columna categórica y una numérica para graficar")
+        return
+
+    c1, c2, c3, c4 = st.columns(4)
+    with c1:
+        x_col = st.selectbox("Categoría (Eje Y):", categorical_cols, key="viz_cat")
+    with c2:
+        y_col = st.selectbox("Valor (Eje X):", numeric_cols, key="viz_num")
+    with c3:
+        chart_type = st.selectbox("Tipo:", ["Barras", "Línea", "Puntos"], key="viz_type")
+    with c4:
+        max_items = st.slider("Máximo:", 5, 50, min(15, len(df_viz)), key="viz_max")
+
+    st.altair_chart(chart_spec(key, x_col, y_col, chart_type, max_items, df_viz), use_container_width=True)
+
+def render_table(key, df):
+    st.dataframe(
+        df,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            col: st.column_config.NumberColumn(format="%.2f")
+            for col in df.select_dtypes(include=['number']).columns
+        }
+    )
+
+def render_export(key, df):
+    st.write("### 📥 Opciones de descarga")
+    c1, c2 = st.columns(2)
+    with c1:
+        # El CSV solo se serializa cuando alguien lo pide (y una vez por resultado)
+        if st.session_state.get("csv_ready_key") == key:
+            st.download_button(
+                label="📄 Descargar CSV",
+                data=csv_bytes(key, df),
+                file_name=f"resultado_{time.strftime('%Y%m%d_%H%M%S')}.csv",
+                mime="text/csv",
+                use_container_width=True
+            )
+        elif st.button("📄 Preparar CSV", use_container_width=True):
+            st.session_state.csv_ready_key = key
+            st.rerun(scope="fragment")
+    with c2:
+        if st.button("💾 Guardar en servidor", use_container_width=True):
+            filepath = save_to_csv(df)
+            st.success(f"✅ Guardado: {filepath}")
+
+def render_stats(key, df):
+    st.write("### 📊 Estadísticas descriptivas")
+
+    stats_df, quick = stats_artifacts(key, df)
+    if stats_df is None:
+        st.info("No hay columnas numéricas para mostrar estadísticas")
+        return
+
+    st.dataframe(
+        stats_df,
+        use_container_width=True,
+        column_config={
+            col: st.column_config.NumberColumn(format="%.2f")
+            for col in stats_df.columns
+        }
+    )
+
+    # Resumen adicional
+    st.write("#### 📈 Resumen rápido")
+    cols = list(quick)
+    half = len(cols) // 2 + 1
+    col1, col2 = st.columns(2)
+    for container, subset in ((col1, cols[:half]), (col2, cols[half:])):
+        with container:
+            for col in subset:
+                vmin, vmax, vmean = quick[col]
+                st.write(f"**{col}**")
+                st.write(f"- Mínimo: {vmin:,.2f}")
+                st.write(f"- Máximo: {vmax:,.2f}")
+                st.write(f"- Media: {vmean:,.2f}")
+                st.write("")
+
+RESULT_VIEWS = {
+    "📈 Gráfico": render_chart,
+    "📋 Tabla": render_table,
+    "📥 Exportar": render_export,
+    "📊 Estadísticas": render_stats,
+}
+
+@st.fragment
+def results_view():
+    df = st.session_state.last_df
+    key = st.session_state.last_df_key
+
+    # Métricas arriba
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("📋 Filas", f"{len(df):,}")
+    with col2:
+        st.metric("📊 Columnas", len(df.columns))
+    with col3:
+        st.metric("⏱️ Tiempo", f"{st.session_state.last_time:.2f}s" if st.session_state.last_time else "N/A")
+    with col4:
+        total_sum = summary_metrics(key, df)["total"]
+        if total_sum > 0:
+            st.metric("💰 Total", f"{total_sum:,.0f}")
+
+    st.write("")  # Espaciado
+
+    # Vista activa: a diferencia de st.tabs, solo se calcula la seleccionada
+    view = st.radio("Vista", list(RESULT_VIEWS), horizontal=True, key="results_tab", label_visibility="collapsed")
+    RESULT_VIEWS[view](key, df)
+
 # ============= UI PRINCIPAL =============
 st.title("📊 Agente Inteligente de Análisis de Ventas")
 st.caption("Haz preguntas en lenguaje natural sobre los datos de ventas")
@@ -277,58 +374,70 @@ with col2:
 
 # ============= PROCESAR CONSULTA =============
 if (query and ejecutar) or (ejemplo_seleccionado and st.sidebar.button("Usar ejemplo")):
-    consulta_actual = query if query else ejemplo_seleccionado
+    consulta_original = query if query else ejemplo_seleccionado
 
-    # 🔒 Regla dura: si no hay año explícito y hay mes, añadimos el año más reciente con datos
-    consulta_actual = infer_missing_year_from_query(consulta_actual, db)
+    preview_slot = st.empty()
 
-    with st.spinner("🤔 Procesando tu consulta..."):
-        output_type = detect_output_type(consulta_actual)
+    def show_preview(df_approx, fraction):
+        """Vista previa aproximada (tabla + gráfico) mientras corre la SQL exacta."""
+        with preview_slot.container():
+            st.caption(
+                f"≈ Vista previa aproximada sobre una muestra del {fraction:.1%} "
+                "(columnas *_IC95: ± intervalo del 95 %). Calculando el resultado exacto..."
+            )
+            st.dataframe(df_approx, use_container_width=True, hide_index=True)
+            num_cols = df_approx.select_dtypes(include=['number']).columns
+            cat_cols = df_approx.select_dtypes(exclude=['number']).columns
+            if len(num_cols) and len(cat_cols):
+                st.bar_chart(df_approx.set_index(cat_cols[0])[num_cols[0]].head(20))
 
+    with st.spinner("🤔 Procesando tu consulta..."):
         try:
-            start_time = time.time()
-            result = agent.invoke({"input": consulta_actual})
-            elapsed_time = time.time() - start_time
-
-            steps = result.get("intermediate_steps", [])
-            sql_query, raw_results = extract_sql_and_results(steps)
-
-            df = pd.DataFrame()
-            chosen_sql = sql_query
-
-            if sql_query is not None and raw_results is not None:
-                df = results_to_dataframe(sql_query, raw_results)
-
-                # 🛟 Fallback: si salió vacío y el SQL trae un BETWEEN fuera de rango, parcheamos y re-ejecutamos
-                if df.empty and sql_query:
-                    patched_sql = patch_sql_to_latest_year_if_out_of_range(sql_query, db)
-                    if patched_sql and patched_sql != sql_query:
-                        try:
-                            with db._engine.connect() as conn:
-                                df2 = pd.read_sql_query(text(patched_sql), conn)
-                            if not df2.empty:
-                                # normalizamos como arriba (upper y normalization)
-                                df2.columns = [c.replace('"', '').replace('`', '').strip().upper() for c in df2.columns]
-                                df2 = df2.applymap(_normalize_cell)
-                                df = df2
-                                chosen_sql = patched_sql
-                                st.info("ℹ️ La consulta se ajustó automáticamente al año más reciente con datos.")
-                        except Exception as e:
-                            # si falla el reintento seguimos con df vacío
-                            pass
+            agent, db = get_shared_agent_and_db()
+            answer = answer_question(
+                agent, db, consulta_original,
+                on_preview=show_preview if approx_preview else None
+            )
+            preview_slot.empty()  # el resultado exacto sustituye a la vista previa
+            consulta_actual = answer["query"]
+            chosen_sql = answer["sql"]
+            df = answer["df"]
+            computed_at = answer["computed_at"]
+            elapsed_time = answer["timings"]["total"]
+            output_type = answer["intent"]["output_type"]
+
+            if answer["patched"]:
+                st.info("ℹ️ La consulta se ajustó automáticamente al año más reciente con datos.")
+            if answer["template"]:
+                st.caption("🧩 Resuelta con una plantilla SQL de una pregunta equivalente (sin LLM)")
+            if len(answer["cascade"]) > 1:
+                st.caption("🪜 " + " → ".join(
+                    f"{a['model_id']} ({'✅' if a['accepted'] else a['reason']}, {a['seconds']:.1f}s)"
+                    for a in answer["cascade"]
+                ))
 
             if chosen_sql is not None:
-                st.session_state.last_df = df.applymap(_normalize_cell)
+                log_question(
+                    consulta_original, chosen_sql, len(df), elapsed_time,
+                    llm_calls=answer["llm_calls"], fewshot=answer["fewshot"],
+                    template=answer["template"], model=answer["model"]
+                )
+
+                st.session_state.last_df = df
+                st.session_state.last_df_key = result_key(df)
                 st.session_state.last_sql = chosen_sql
                 st.session_state.last_query = consulta_actual
                 st.session_state.last_time = elapsed_time
+                st.session_state.last_computed_at = computed_at
 
                 st.session_state.history.insert(0, {
                     "query": consulta_actual,
                     "type": output_type,
                     "df": df,
                     "sql": chosen_sql,
-                    "time": elapsed_time
+                    "time": elapsed_time,
+                    "computed_at": computed_at,
+                    "key": st.session_state.last_df_key
                 })
                 st.session_state.history = st.session_state.history[:10]
             else:
@@ -343,194 +452,48 @@ if st.session_state.last_df is not None and not st.session_state.last_df.empty:
     # SQL ejecutado (colapsado por defecto y sin duplicados)
     with st.expander("🔍 Ver SQL ejecutado"):
         st.code(st.session_state.last_sql, language="sql")
-
-    # Métricas arriba
-    col1, col2, col3, col4 = st.columns(4)
-    with col1:
-        st.metric("📋 Filas", f"{len(st.session_state.last_df):,}")
-    with col2:
-        st.metric("📊 Columnas", len(st.session_state.last_df.columns))
-    with col3:
-        st.metric("⏱️ Tiempo", f"{st.session_state.last_time:.2f}s" if st.session_state.last_time else "N/A")
-    with col4:
-        total_sum = st.session_state.last_df.select_dtypes(include=['number']).sum().sum()
-        if total_sum > 0:
-            st.metric("💰 Total", f"{total_sum:,.0f}")
-
-    st.write("")  # Espaciado
-
-    # Tabs: Gráfico / Tabla / Exportar / Estadísticas
-    tab1, tab2, tab3, tab4 = st.tabs(["📈 Gráfico", "📋 Tabla", "📥 Exportar", "📊 Estadísticas"])
-
-    with tab1:
-        if len(st.session_state.last_df.columns) >= 2:
-            # 👇 Copia y normaliza otra vez por si llegó algo raro
-            df_viz = st.session_state.last_df.copy().applymap(_normalize_cell)
-
-            # Si alguna numérica quedó como object, fuerzala a numérica
-            for c in df_viz.columns:
-                if df_viz[c].dtype == "object":
-                    try:
-                        df_viz[c] = pd.to_numeric(df_viz[c])
-                    except Exception:
-                        pass
-            numeric_cols = df_viz.select_dtypes(include=['number']).columns.tolist()
-            categorical_cols = df_viz.select_dtypes(exclude=['number']).columns.tolist()
-
-            if numeric_cols and categorical_cols:
-                c1, c2, c3, c4 = st.columns(4)
-                with c1:
-                    x_col = st.selectbox("Categoría (Eje Y):", categorical_cols, key="viz_cat")
-                with c2:
-                    y_col = st.selectbox("Valor (Eje X):", numeric_cols, key="viz_num")
-                with c3:
-                    chart_type = st.selectbox("Tipo:", ["Barras", "Línea", "Puntos"], key="viz_type")
-                with c4:
-                    max_items = st.slider("Máximo:", 5, 50, min(15, len(df_viz)), key="viz_max")
-
-                df_plot = df_viz.nlargest(max_items, y_col) if y_col in numeric_cols else df_viz.head(max_items)
-
-                
-                color_palette = [
-                    "#4E79A7", "#F28E2B", "#E15759", "#76B7B2", "#59A14F",
-                    "#EDC948", "#B07AA1", "#FF9DA7", "#9C755F", "#BAB0AC",
-                ]
-
-                if chart_type == "Barras":
-                    chart = alt.Chart(df_plot).mark_bar().encode(
-                        x=alt.X(y_col, title=y_col.replace('_', ' ').title()),
-                        y=alt.Y(x_col, sort='-x', title=x_col.replace('_', ' ').title()),
-                        color=alt.Color(
-                            x_col,
-                            scale=alt.Scale(
-                                domain=df_plot[x_col].tolist(),
-                                range=color_palette[:len(df_plot)]
-                            ),
-                            legend=None
-                        ),
-                        tooltip=[alt.Tooltip(x_col, title=x_col.replace('_', ' ').title()),
-                                 alt.Tooltip(y_col, title=y_col.replace('_', ' ').title(), format=',.0f')]
-                    )
-                elif chart_type == "Línea":
-                    chart = alt.Chart(df_plot).mark_line(
-                        point=alt.OverlayMarkDef(color="red", size=100)
-                    ).encode(
-                        x=alt.X(x_col, title=x_col.replace('_', ' ').title()),
-                        y=alt.Y(y_col, title=y_col.replace('_', ' ').title()),
-                        tooltip=[alt.Tooltip(x_col, title=x_col.replace('_', ' ').title()),
-                                 alt.Tooltip(y_col, title=y_col.replace('_', ' ').title(), format=',.0f')]
-                    )
-                else:  # Puntos
-                    chart = alt.Chart(df_plot).mark_circle(size=200).encode(
-                        x=alt.X(x_col, title=x_col.replace('_', ' ').title()),
-                        y=alt.Y(y_col, title=y_col.replace('_', ' ').title()),
-                        color=alt.Color(
-                            x_col,
-                            scale=alt.Scale(
-                                domain=df_plot[x_col].tolist(),
-                                range=color_palette[:len(df_plot)]
-                            ),
-                            legend=None
-                        ),
-                        size=alt.Size(y_col, legend=None),
-                        tooltip=[alt.Tooltip(x_col, title=x_col.replace('_', ' ').title()),
-                                 alt.Tooltip(y_col, title=y_col.replace('_', ' ').title(), format=',.0f')]
-                    )
-
-                chart = chart.properties(
-                    height=450,
-                    title={
-                        "text": f"{y_col.replace('_', ' ').title()} por {x_col.replace('_', ' ').title()}",
-                        "fontSize": 16,
-                        "anchor": "middle"
-                    }
-                ).interactive().configure_axis(
-                    labelFontSize=12,
-                    titleFontSize=14
-                )
-
-                st.altair_chart(chart, use_container_width=True)
+        if st.button("📌 Guardar consulta (se actualiza sola con datos nuevos)"):
+            try:
+                _, db = get_shared_agent_and_db()
+                save_query(db, st.session_state.last_query, st.session_state.last_sql)
+                st.success("✅ Consulta guardada")
+            except Exception as e:
+                st.error(f"❌ No se pudo guardar: {e}")
+
+    if st.session_state.last_computed_at is not None:
+        st.caption(f"⚡ Respuesta precalculada {format_age(time.time() - st.session_state.last_computed_at)}")
+
+    results_view()
+
+
+# ============= CONSULTAS GUARDADAS (MODO WATCH) =============
+# El hilo de refresco actualiza los resultados en memoria del proceso; el fragmento se
+# vuelve a pintar solo cada WATCH_INTERVAL segundos, sin rerun de la página.
+@st.fragment(run_every=WATCH_INTERVAL)
+def saved_queries_view():
+    saved = list_saved()
+    if not saved:
+        return
+    st.divider()
+    st.subheader(f"📌 Consultas guardadas ({len(saved)})")
+    for entry in saved:
+        df = entry.get("df")
+        with st.expander(entry["question"][:80]):
+            if df is None:
+                st.caption("⏳ Calculando...")
             else:
-                st.info("📊 Se necesita al menos una columna categórica y una numérica para graficar")
-        else:
-            st.info("📊 Se necesitan al menos 2 columnas para crear un gráfico")
-
-    with tab2:
-        st.dataframe(
-            st.session_state.last_df,
-            use_container_width=True,
-            hide_index=True,
-            column_config={
-                col: st.column_config.NumberColumn(format="%.2f")
-                for col in st.session_state.last_df.select_dtypes(include=['number']).columns
-            }
-        )
-
-    with tab3:
-        st.write("### 📥 Opciones de descarga")
-        c1, c2  = st.columns(2)
-        with c1:
-            csv = st.session_state.last_df.to_csv(index=False)
-            st.download_button(
-                label="📄 Descargar CSV",
-                data=csv,
-                file_name=f"resultado_{time.strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv",
-                use_container_width=True
-            )
-        with c2:
-            if st.button("💾 Guardar en servidor", use_container_width=True):
-                filepath = save_to_csv(st.session_state.last_df)
-                st.success(f"✅ Guardado: {filepath}")
-    with tab4:
-        # ESTADÍSTICAS SIMPLIFICADAS (sin el histograma problemático)
-        st.write("### 📊 Estadísticas descriptivas")
-
-        numeric_df = st.session_state.last_df.select_dtypes(include=['number'])
-
-        if not numeric_df.empty:
-            # 👉 describe() con índices traducidos al español (OJO: no lo sobrescribas luego)
-            stats_df = numeric_df.describe().rename(index={
-                "count": "conteo",
-                "mean": "media",
-                "std": "desviación estándar",
-                "min": "mínimo",
-                "25%": "25 %",
-                "50%": "mediana",
-                "75%": "75 %",
-                "max": "máximo"
-            })
-
-            st.dataframe(
-                stats_df,
-                use_container_width=True,
-                column_config={
-                    col: st.column_config.NumberColumn(format="%.2f")
-                    for col in stats_df.columns
-                }
-            )
+                st.caption(
+                    f"Actualizada {format_age(time.time() - entry['updated_at'])} · "
+                    f"{'incremental' if entry.get('mode') == 'incremental' else 'completa'} "
+                    f"({entry.get('refresh_seconds', 0):.2f}s) · hasta id {entry['watermark']:,}"
+                    + ("" if entry["plan"] else " · se recalcula entera")
+                )
+                st.dataframe(df, use_container_width=True, hide_index=True)
+            if st.button("🗑️ Quitar", key=f"unsave_{entry['id']}"):
+                remove_saved(entry["id"])
+                st.rerun(scope="fragment")
 
-            # Resumen adicional
-            st.write("#### 📈 Resumen rápido")
-            col1, col2 = st.columns(2)
-
-            with col1:
-                for col in numeric_df.columns[:len(numeric_df.columns)//2 + 1]:
-                    st.write(f"**{col}**")
-                    st.write(f"- Mínimo: {numeric_df[col].min():,.2f}")
-                    st.write(f"- Máximo: {numeric_df[col].max():,.2f}")
-                    st.write(f"- Media: {numeric_df[col].mean():,.2f}")
-                    st.write("")
-
-            with col2:
-                for col in numeric_df.columns[len(numeric_df.columns)//2 + 1:]:
-                    st.write(f"**{col}**")
-                    st.write(f"- Mínimo: {numeric_df[col].min():,.2f}")
-                    st.write(f"- Máximo: {numeric_df[col].max():,.2f}")
-                    st.write(f"- Media: {numeric_df[col].mean():,.2f}")
-                    st.write("")
-        else:
-            st.info("No hay columnas numéricas para mostrar estadísticas")
+saved_queries_view()
 
 
 # ============= HISTORIAL (COLAPSADO) =============
@@ -548,7 +511,9 @@ if st.session_state.history:
             with c2:
                 if st.button("Ver", key=f"view_{i}", use_container_width=True):
                     st.session_state.last_df = item["df"]
+                    st.session_state.last_df_key = item.get("key") or result_key(item["df"])
                     st.session_state.last_sql = item["sql"]
                     st.session_state.last_query = item["query"]
                     st.session_state.last_time = item.get("time", 0)
+                    st.session_state.last_computed_at = item.get("computed_at")
                     st.rerun()